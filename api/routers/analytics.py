@@ -5,7 +5,7 @@ from datetime import date
 
 from services.company import CompanyService
 from services.analytics import AnalyticsService
-from utils.dependencies import get_company_service, get_analytics_service
+from utils.dependencies import get_company_read_service, get_analytics_service
 from api.routers.users import get_user_data
 analytics_router = APIRouter()
 
@@ -22,6 +22,18 @@ async def user_gets_average_rating_about_himself(
     return user_rating
 
 
+@analytics_router.get("/analytics/rating/summary", response_model=dict)
+async def user_gets_score_summary_about_himself(
+        user_email: str = Depends(get_user_data),
+        analytics_service: AnalyticsService = Depends(get_analytics_service),
+):
+    try:
+        score_summary = await analytics_service.get_self_score_summary(user_email)
+    except HTTPException as exc:
+        raise exc
+    return score_summary
+
+
 @analytics_router.get("/analytics/rating/quizzes", response_model=List[dict])
 async def get_user_rating_by_all_quizzes_by_date(
         start_date: date = Query(..., description="2010-02-02"),
@@ -55,7 +67,7 @@ async def company_get_average_scores(
         start_date: date = Query(..., description="2010-02-02"),
         end_date: date = Query(..., description="2020-02-02"),
         user_email: str = Depends(get_user_data),
-        company_service: CompanyService = Depends(get_company_service),
+        company_service: CompanyService = Depends(get_company_read_service),
         analytics_service: AnalyticsService = Depends(get_analytics_service),
 ):
     try:
@@ -75,7 +87,7 @@ async def company_get_average_scores_by_user_id(
         start_date: date = Query(..., description="2010-02-02"),
         end_date: date = Query(...,  description="2020-02-02"),
         user_email: str = Depends(get_user_data),
-        company_service: CompanyService = Depends(get_company_service),
+        company_service: CompanyService = Depends(get_company_read_service),
         analytics_service: AnalyticsService = Depends(get_analytics_service),
 ):
     try:
@@ -92,7 +104,7 @@ async def company_get_average_scores_by_user_id(
 async def company_get_all_users_and_last_completion_time(
         company_id: int = Path(),
         user_email: str = Depends(get_user_data),
-        company_service: CompanyService = Depends(get_company_service),
+        company_service: CompanyService = Depends(get_company_read_service),
         analytics_service: AnalyticsService = Depends(get_analytics_service),
 ):
     try:
@@ -8,7 +8,8 @@ from schemas.company import (ShowCompany, CompanyCreate, UpdateCompany, UpdateCo
                              UpdateCompanyRoleResponse, UpdateCompanyRoleRequest, RoleType)
 from schemas.users import ShowUser
 from services.company import CompanyService
-from utils.dependencies import get_company_service
+from utils.dependencies import get_company_service, get_company_read_service, get_unit_of_work
+from db.unit_of_work import UnitOfWork
 from api.routers.users import get_user_data
 
 company_router = APIRouter()
@@ -16,11 +17,12 @@ company_router = APIRouter()
 
 @company_router.get("/companies/", response_model=Page[ShowCompany])
 async def get_all_companies(params: Params = Depends(), user_email: str = Depends(get_user_data),
-                            company_service: CompanyService = Depends(get_company_service)):
-    companies = await company_service.get_all_companies()
-    if not companies:
+                            company_service: CompanyService = Depends(get_company_read_service)):
+    raw_params = params.to_raw_params()
+    companies, total = await company_service.get_companies_page(raw_params.offset, raw_params.limit)
+    if not total:
         raise HTTPException(status_code=404, detail="No companies found")
-    return paginate(companies, params)
+    return Page.create(companies, params, total=total)
 
 
 @company_router.get("/company/{company_id}/", response_model=ShowCompany)
@@ -111,7 +113,8 @@ async def company_cancel_request_to_user(
 async def company_update_user_request(
         request_data: UpdateCompanyRequest = Body(...),
         user_email: str = Depends(get_user_data),
-        company_service: CompanyService = Depends(get_company_service)
+        company_service: CompanyService = Depends(get_company_service),
+        unit_of_work: UnitOfWork = Depends(get_unit_of_work)
 ):
     try:
         request_id = request_data.request_id
@@ -127,10 +130,12 @@ async def company_update_user_request(
             # update on Declined
             await company_service.accepted_or_declined_user_request(request_id, request_data)
         else:
-            # update on Accepted
-            await company_service.accepted_or_declined_user_request(request_id, request_data)
-            # add user to company_membership with role USER
-            await company_service.company_add_user_to_membership(request_id)
+            # accept the request and add the membership in one transaction
+            async with unit_of_work:
+                # update on Accepted
+                await company_service.accepted_or_declined_user_request(request_id, request_data)
+                # add user to company_membership with role USER
+                await company_service.company_add_user_to_membership(request_id)
     except HTTPException as exc:
         raise exc
 
@@ -266,7 +271,8 @@ async def user_cancel_request_to_company(
 async def user_update_company_request_status(
         request_data: UpdateCompanyRequest = Body(...),
         user_email: str = Depends(get_user_data),
-        company_service: CompanyService = Depends(get_company_service)
+        company_service: CompanyService = Depends(get_company_service),
+        unit_of_work: UnitOfWork = Depends(get_unit_of_work)
 ):
     try:
         request_id = request_data.request_id
@@ -283,10 +289,12 @@ async def user_update_company_request_status(
             # update on Declined
             await company_service.accepted_or_declined_user_request(request_id, request_data)
         else:
-            # update on Accepted
-            await company_service.accepted_or_declined_user_request(request_id, request_data)
-            # add user to company_membership with role USER
-            await company_service.company_add_user_to_membership(request_id)
+            # accept the request and add the membership in one transaction
+            async with unit_of_work:
+                # update on Accepted
+                await company_service.accepted_or_declined_user_request(request_id, request_data)
+                # add user to company_membership with role USER
+                await company_service.company_add_user_to_membership(request_id)
     except HTTPException as exc:
         raise exc
 
@@ -1,10 +1,11 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Path, Response
+from fastapi import APIRouter, Depends, HTTPException, Body, Path, Response, Query
 from fastapi_pagination import Page, Params, paginate
 from fastapi.responses import FileResponse
 
 from schemas.notifications import NotificationResponse
+from schemas.pagination import CursorPage
 from schemas.questions import QuestionUpdate
 from schemas.answers import AnswerUpdate
 from services.company import CompanyService
@@ -29,6 +30,21 @@ async def user_get_active_notifications(
     return notifications
 
 
+@notifications_router.get("/notifications/cursor/", response_model=CursorPage[NotificationResponse])
+async def user_get_notifications_by_cursor(
+        cursor: Optional[str] = Query(None),
+        size: int = Query(50, ge=1, le=100),
+        user_email: str = Depends(get_user_data),
+        notification_service: NotificationsService = Depends(get_notifications_service),
+):
+    try:
+        notifications, next_cursor = await notification_service.user_get_notifications_by_cursor(user_email, cursor,
+                                                                                                  size)
+    except HTTPException as exc:
+        raise exc
+    return {"items": notifications, "next_cursor": next_cursor}
+
+
 @notifications_router.put("/notifications/{notification_id}/read/", response_model=NotificationResponse)
 async def user_mark_notification_as_read(
         notification_id: int,
@@ -1,16 +1,22 @@
-from typing import List
+import os
+import uuid
+from typing import Any, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Path, Response
-from fastapi_pagination import Page, Params, paginate
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Body, Path, Response, Query
+from fastapi_pagination import Page, Params
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse
+from celery.result import AsyncResult
 
-from schemas.quizzes import QuizCreate, QuizUpdate, UserAnswersCreate, AnswerResponse, QuestionResponse, QuizResponse, QuizResultResponse, UserAnswersResponse, QuizResultCreate
+from schemas.quizzes import QuizCreate, QuizUpdate, UserAnswersCreate, AnswerResponse, QuestionResponse, QuizResponse, QuizResultResponse, UserAnswersResponse, QuizResultCreate, ExportJobResponse
 from schemas.questions import QuestionUpdate
+from schemas.pagination import CursorPage
 from schemas.answers import AnswerUpdate
 from services.company import CompanyService
 from services.quizzes import QuizService
 from utils.dependencies import get_company_service, get_quiz_service
 from api.routers.users import get_user_data
+from celery_worker import celery, export_company_results_task
 
 quiz_router = APIRouter()
 
@@ -73,11 +79,13 @@ async def get_quiz_by_id(
         await company_service.check_who_this_user_in_company_admin_or_owner_by_company_id(user_email, company_id)
 
         # Retrieve the quiz by ID
-        quiz = await quiz_service.get_quiz_by_quiz_id(quiz_id)
+        quiz = await quiz_service.get_quiz(quiz_id)
+        if not quiz:
+            raise HTTPException(status_code=404, detail="No quiz found")
     except HTTPException as exc:
         raise exc
 
-    return quiz
+    return quiz._asdict()
 
 
 # Route to get a list of quizzes for a specific company
@@ -94,12 +102,13 @@ async def get_all_quizzes_by_company(
         await company_service.check_who_this_user_in_company_admin_or_owner_by_company_id(user_email, company_id)
 
         # Retrieve quizzes by company ID
-        quizzes = await quiz_service.get_all_quizzes()
+        raw_params = params.to_raw_params()
+        quizzes, total = await quiz_service.get_company_quizzes_page(company_id, raw_params.offset, raw_params.limit)
 
     except HTTPException as exc:
         raise exc
 
-    return paginate(quizzes, params)
+    return Page.create(quizzes, params, total=total)
 
 
 # Route to delete an existing quiz
@@ -180,13 +189,14 @@ async def get_all_question_by_quiz_id(
         # Check if the user is the owner or admin of the company
         await company_service.check_who_this_user_in_company_admin_or_owner_by_company_id(user_email, company_id)
 
-        # Retrieve quizzes by company ID
-        quizzes = await quiz_service.get_all_questions(quiz_id)
+        # Retrieve questions by quiz ID
+        raw_params = params.to_raw_params()
+        questions, total = await quiz_service.get_questions_page(quiz_id, raw_params.offset, raw_params.limit)
 
     except HTTPException as exc:
         raise exc
 
-    return paginate(quizzes, params)
+    return Page.create(questions, params, total=total)
 
 @quiz_router.get("/company/{company_id}/quizzes/question/{question_id}/", response_model=Page[AnswerResponse])
 async def get_all_answers_by_question_id(
@@ -201,13 +211,14 @@ async def get_all_answers_by_question_id(
         # Check if the user is the owner or admin of the company
         await company_service.check_who_this_user_in_company_admin_or_owner_by_company_id(user_email, company_id)
 
-        # Retrieve quizzes by company ID
-        quizzes = await quiz_service.get_all_answer(question_id)
+        # Retrieve answers by question ID
+        raw_params = params.to_raw_params()
+        answers, total = await quiz_service.get_answers_page(question_id, raw_params.offset, raw_params.limit)
 
     except HTTPException as exc:
         raise exc
 
-    return paginate(quizzes, params)
+    return Page.create(answers, params, total=total)
 
 
 @quiz_router.post("/company/{company_id}/quiz/{quiz_id}/question/{question_id}/user_answer/", response_model=UserAnswersResponse)
@@ -246,6 +257,34 @@ async def create_quiz_result(
     return created_quiz_result
 
 
+@quiz_router.get("/quizzes/results/cursor/", response_model=CursorPage[QuizResultResponse])
+async def get_user_quiz_results_by_cursor(
+        cursor: Optional[str] = Query(None),
+        size: int = Query(50, ge=1, le=100),
+        user_email: str = Depends(get_user_data),
+        quiz_service: QuizService = Depends(get_quiz_service),
+):
+    try:
+        quiz_results, next_cursor = await quiz_service.get_user_quiz_results_by_cursor(user_email, cursor, size)
+    except HTTPException as exc:
+        raise exc
+    return {"items": quiz_results, "next_cursor": next_cursor}
+
+
+@quiz_router.get("/quizzes/user_answers/cursor/", response_model=CursorPage[UserAnswersResponse])
+async def get_user_answers_by_cursor(
+        cursor: Optional[str] = Query(None),
+        size: int = Query(50, ge=1, le=100),
+        user_email: str = Depends(get_user_data),
+        quiz_service: QuizService = Depends(get_quiz_service),
+):
+    try:
+        user_answers, next_cursor = await quiz_service.get_user_answers_by_cursor(user_email, cursor, size)
+    except HTTPException as exc:
+        raise exc
+    return {"items": user_answers, "next_cursor": next_cursor}
+
+
 @quiz_router.get("/export/json/{user_id}")
 async def export_json_data(
         user_id: int,
@@ -270,12 +309,123 @@ async def export_csv_data(
         # Check if the user is the owner or admin of the company
         await quiz_service.verification_of_belonging_to_one_company(user_email, user_id)
 
-        data_frame = await quiz_service.export_csv_data_by_user_id(user_id)
+    except HTTPException as exc:
+        raise exc
+
+    # rows are written to the response as they are read, nothing touches the disk
+    return StreamingResponse(quiz_service.export_csv_data_by_user_id(user_id), media_type='text/csv',
+                             headers={'Content-Disposition': f'attachment; filename="user_{user_id}_data.csv"'})
+
+
+# Route to download the user's results as a Parquet file
+@quiz_router.get("/export/parquet/{user_id}/download/")
+async def export_parquet_data(
+        user_id: int,
+        user_email: str = Depends(get_user_data),
+        quiz_service: QuizService = Depends(get_quiz_service),
+):
+    try:
+        await quiz_service.verification_of_belonging_to_one_company(user_email, user_id)
+    except HTTPException as exc:
+        raise exc
+
+    content = await quiz_service.export_parquet_data_by_user_id(user_id)
+    return Response(content, media_type='application/vnd.apache.parquet',
+                    headers={'Content-Disposition': f'attachment; filename="user_{user_id}_data.parquet"'})
+
+
+# Route to download the user's results as an Arrow IPC file
+@quiz_router.get("/export/arrow/{user_id}/download/")
+async def export_arrow_data(
+        user_id: int,
+        user_email: str = Depends(get_user_data),
+        quiz_service: QuizService = Depends(get_quiz_service),
+):
+    try:
+        await quiz_service.verification_of_belonging_to_one_company(user_email, user_id)
+    except HTTPException as exc:
+        raise exc
+
+    content = await quiz_service.export_arrow_data_by_user_id(user_id)
+    return Response(content, media_type='application/vnd.apache.arrow.file',
+                    headers={'Content-Disposition': f'attachment; filename="user_{user_id}_data.arrow"'})
+
+
+def company_export_job_id(company_id: int) -> str:
+    # the owner is part of the id, a failed job keeps no company_id in its result
+    return f"company-{company_id}-{uuid.uuid4().hex}"
+
+
+def get_company_export_job(company_id: int, job_id: str) -> Tuple[str, Any]:
+    """State and info of the company's export job, blocking on the result backend: call in a thread."""
+    # a job id of another company (or an unknown one) looks the same as a missing job
+    if not job_id.startswith(f"company-{company_id}-"):
+        raise HTTPException(status_code=404, detail="Not found export job")
+    job = AsyncResult(job_id, app=celery)
+    return job.state, job.info
+
+
+# Start exporting all quiz results of a company in the background
+@quiz_router.post("/export/company/{company_id}/", response_model=ExportJobResponse)
+async def start_company_export(
+        company_id: int,
+        file_format: str = Query("csv", pattern="^(csv|parquet)$"),
+        user_email: str = Depends(get_user_data),
+        company_service: CompanyService = Depends(get_company_service),
+):
+    try:
+        # Check if the user is the owner or admin of the company
+        await company_service.check_who_this_user_in_company_admin_or_owner_by_company_id(user_email, company_id)
+    except HTTPException as exc:
+        raise exc
+
+    # publishing blocks on the broker
+    job = await run_in_threadpool(export_company_results_task.apply_async, (company_id, file_format),
+                                  task_id=company_export_job_id(company_id))
+    return {"job_id": job.id, "status": "PENDING"}
+
 
+# Poll the progress of a company export job
+@quiz_router.get("/export/company/{company_id}/{job_id}/", response_model=ExportJobResponse)
+async def get_company_export_status(
+        company_id: int,
+        job_id: str,
+        user_email: str = Depends(get_user_data),
+        company_service: CompanyService = Depends(get_company_service),
+):
+    try:
+        await company_service.check_who_this_user_in_company_admin_or_owner_by_company_id(user_email, company_id)
     except HTTPException as exc:
         raise exc
-    csv_filename = f"user_{user_id}_data.csv"
 
-    data_frame.to_csv(csv_filename, index=False)
+    state, info = await run_in_threadpool(get_company_export_job, company_id, job_id)
+    if state == "FAILURE":
+        return {"job_id": job_id, "status": state, "error": str(info)}
+    info = info if isinstance(info, dict) else {}
+    return {"job_id": job_id, "status": state, "rows": info.get("rows"), "total": info.get("total")}
+
+
+# Download the file of a finished company export job
+@quiz_router.get("/export/company/{company_id}/{job_id}/download/")
+async def download_company_export(
+        company_id: int,
+        job_id: str,
+        user_email: str = Depends(get_user_data),
+        company_service: CompanyService = Depends(get_company_service),
+):
+    try:
+        await company_service.check_who_this_user_in_company_admin_or_owner_by_company_id(user_email, company_id)
+    except HTTPException as exc:
+        raise exc
 
-    return FileResponse(csv_filename, filename=f'user_{user_id}_data.csv', media_type='multipart/form-data')
+    state, info = await run_in_threadpool(get_company_export_job, company_id, job_id)
+    if state == "FAILURE":
+        raise HTTPException(status_code=500, detail=f"Export job failed: {info}")
+    if state != "SUCCESS":
+        raise HTTPException(status_code=409, detail=f"Export job is {state}")
+
+    file_path = info["file_path"]
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=410, detail="Export file is no longer available")
+    media_type = "application/vnd.apache.parquet" if file_path.endswith(".parquet") else "application/gzip"
+    return FileResponse(file_path, media_type=media_type, filename=os.path.basename(file_path))
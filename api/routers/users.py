@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Path, Body
-from fastapi_pagination import Page, Params, paginate
+from typing import Optional, Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Body, Query
+from fastapi_pagination import Page, Params
 
 from schemas.users import ShowUser, UserCreate, DeleteUserResponse, UpdatedUserResponse, UpdateUserRequest, DeactivateUserRequest
+from schemas.pagination import CursorPage
 from services.users import UsersService
-from utils.dependencies import get_users_service
+from services.principal import Principal
+from utils.dependencies import get_users_service, get_users_read_service
 from utils.security import decode_bearer_token
 
 users_router = APIRouter()
@@ -18,13 +22,35 @@ def get_user_data(user_data: dict = Depends(decode_bearer_token)):
     return email
 
 
+async def get_current_user(user_email: str = Depends(get_user_data),
+                           users_service: UsersService = Depends(get_users_service)) -> Principal:
+    # FastAPI runs this once per request; the services of the request share its session, so their own
+    # lookups of the same email are answered from the principal resolved here
+    user = await users_service.find_auth_user_by_email(user_email)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token, email not found")
+    return user
+
+
+CurrentUser = Annotated[Principal, Depends(get_current_user)]
+
+
 @users_router.get("/users/", response_model=Page[ShowUser])
 async def get_all_users(params: Params = Depends(), user_email: str = Depends(get_user_data),
-                        users_service: UsersService = Depends(get_users_service)):
-    users = await users_service.get_all_users()
+                        users_service: UsersService = Depends(get_users_read_service)):
+    raw_params = params.to_raw_params()
+    users, total = await users_service.get_users_page(raw_params.offset, raw_params.limit)
     if users is None:
         raise HTTPException(status_code=404, detail="Users not found")
-    return paginate(users, params)
+    return Page.create(users, params, total=total)
+
+
+@users_router.get("/users/cursor/", response_model=CursorPage[ShowUser])
+async def get_users_by_cursor(cursor: Optional[str] = Query(None), size: int = Query(50, ge=1, le=100),
+                              user_email: str = Depends(get_user_data),
+                              users_service: UsersService = Depends(get_users_read_service)):
+    users, next_cursor = await users_service.get_users_by_cursor(cursor, size)
+    return {"items": users, "next_cursor": next_cursor}
 
 
 @users_router.get("/user/{user_id}", response_model=ShowUser)
@@ -0,0 +1,48 @@
+"""Micro-benchmark of the per-request auth overhead: JWT verification with and without the verified-token cache.
+
+Run from the project root:
+
+    python -m benchmarks.auth [requests]
+
+PyJWT (`pip install "pyjwt[crypto]"`) is measured as well when it is installed.
+"""
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import config
+from utils import security
+
+ROUNDS = 5
+
+
+def per_request_us(func, requests: int) -> float:
+    return min(timeit.repeat(func, number=requests, repeat=ROUNDS)) / requests * 1e6
+
+
+def measure(name: str, backend: security.JWTBackend, requests: int) -> None:
+    token = backend.encode({"email": "testemail@example.com", "exp": datetime.utcnow() + timedelta(hours=1)})
+    security.jwt_backend = backend
+
+    def uncached():
+        security.verified_tokens.clear()
+        security.verify_token(token)
+
+    security.verify_token(token)
+    cached = per_request_us(lambda: security.verify_token(token), requests)
+    print(f"{name:<16} verify {per_request_us(uncached, requests):8.1f} us   cached {cached:6.2f} us")
+
+
+def main(requests: int) -> None:
+    print(f"{requests} requests, best of {ROUNDS} rounds, {config.ALGORITHM}")
+    measure("python-jose", security.JoseBackend(config.ALGORITHM, config.SECRET_KEY, config.SECRET_KEY), requests)
+    try:
+        backend = security.PyJWTBackend(config.ALGORITHM, config.SECRET_KEY, config.SECRET_KEY)
+    except ImportError:
+        print("pyjwt            not installed")
+        return
+    measure("pyjwt", backend, requests)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
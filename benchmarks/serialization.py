@@ -0,0 +1,55 @@
+"""Micro-benchmark: stdlib json vs the orjson codec on a 10k-row quiz_results export.
+
+Run from the project root:
+
+    python -m benchmarks.serialization [rows]
+"""
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from utils import serialization
+
+ROUNDS = 20
+
+
+def make_export(rows: int) -> list:
+    start = datetime(2023, 1, 1)
+    return [{'user_id': 4, 'quiz_id': index % 50, 'question_id': index % 500, 'user_answer_id': index,
+             'result': index % 3 == 0, 'company_id': 1, 'timestamp': start + timedelta(seconds=index)}
+            for index in range(rows)]
+
+
+def report(name: str, stdlib: float, fast: float) -> None:
+    print(f"{name:<28} json {stdlib * 1000:8.2f} ms   orjson {fast * 1000:8.2f} ms   x{stdlib / fast:5.1f}")
+
+
+def main(rows: int) -> None:
+    export = make_export(rows)
+    encoded = jsonable_encoder(export)
+    cached = [[*row.values()][:-1] + [row['timestamp'].isoformat()] for row in export]
+    print(f"{rows} rows, best of {ROUNDS} rounds")
+
+    # response body: what JSONResponse / ORJSONResponse render after jsonable_encoder
+    report("response render",
+           min(timeit.repeat(lambda: json.dumps(encoded, ensure_ascii=False, separators=(",", ":")).encode(),
+                             number=1, repeat=ROUNDS)),
+           min(timeit.repeat(lambda: serialization.dumps(encoded), number=1, repeat=ROUNDS)))
+
+    # cache entry: the compact positional rows stored in Redis
+    stdlib_entry = json.dumps(["0.1", cached], separators=(",", ":"))
+    fast_entry = serialization.dumps(["0.1", cached])
+    report("cache encode",
+           min(timeit.repeat(lambda: json.dumps(["0.1", cached], separators=(",", ":")), number=1, repeat=ROUNDS)),
+           min(timeit.repeat(lambda: serialization.dumps(["0.1", cached]), number=1, repeat=ROUNDS)))
+    report("cache decode",
+           min(timeit.repeat(lambda: json.loads(stdlib_entry), number=1, repeat=ROUNDS)),
+           min(timeit.repeat(lambda: serialization.loads(fast_entry), number=1, repeat=ROUNDS)))
+    print(f"cache entry size: {len(fast_entry)} bytes")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
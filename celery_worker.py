@@ -2,6 +2,7 @@ from celery.schedules import crontab
 from celery import Celery
 from config import settings
 from tasks.notification import create_notifications
+from tasks.export import export_company_results
 
 celery = Celery(__name__)
 celery.conf.broker_url = settings.CELERY_BROKER_URL
@@ -19,3 +20,11 @@ celery.conf.beat_schedule = {
 @celery.task(name="check_test_times")
 def check_test_times():
     create_notifications()
+
+
+@celery.task(name="export_company_results", bind=True)
+def export_company_results_task(self, company_id: int, file_format: str = "csv") -> dict:
+    def report_progress(rows: int, total: int):
+        self.update_state(state="PROGRESS", meta={"company_id": company_id, "rows": rows, "total": total})
+
+    return export_company_results(company_id, file_format, on_progress=report_progress)
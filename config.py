@@ -36,13 +36,64 @@ class Settings(BaseSettings):
 
     DATABASE_MAX_CONNECTIONS: int
     DATABASE_CONNECTION_RECYCLE: int
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: int = 30
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_STATEMENT_CACHE_SIZE: int = 100
+    DATABASE_ECHO: bool = False
+    DATABASE_STREAM_YIELD_PER: int = 1000
+
+    # comma separated read replica urls, read-only requests are routed to them
+    DATABASE_REPLICA_URLS: str = ""
+    DATABASE_REPLICA_RETRY_INTERVAL: int = 30
+    DATABASE_READ_YOUR_WRITES_SECONDS: int = 5
+    DATABASE_TRANSACTION_RETRIES: int = 3
+    DATABASE_TRANSACTION_RETRY_DELAY: float = 0.05
 
     # redis
     REDIS_HOST: str
     REDIS_PORT: int
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: int = 5
+    REDIS_SOCKET_TIMEOUT: float = 2.0
+    REDIS_CONNECT_TIMEOUT: float = 2.0
+
+    # bcrypt runs on its own thread pool, see utils/hashing.py
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # jwt, see utils/security.py; asymmetric ALGORITHMs (ES256, EdDSA...) read the PEM key files
+    JWT_BACKEND: str = "jose"
+    JWT_PRIVATE_KEY_FILE: str = ""
+    JWT_PUBLIC_KEY_FILE: str = ""
+    JWT_CACHE_SIZE: int = 10000
+    JWT_CACHE_TTL: int = 300
+
+    # authenticated user lookups, see services/principal.py
+    PRINCIPAL_CACHE_TTL: int = 60
+    PRINCIPAL_LOCAL_CACHE_TTL: float = 5.0
+    PRINCIPAL_LOCAL_CACHE_SIZE: int = 10000
+
+    # company roles and memberships, see services/authorization.py
+    AUTHZ_CACHE_TTL: int = 300
+    AUTHZ_LOCAL_CACHE_TTL: float = 5.0
+    AUTHZ_LOCAL_CACHE_SIZE: int = 10000
+
+    # quiz definitions, see services/quiz_snapshot.py
+    QUIZ_SNAPSHOT_CACHE_TTL: int = 86400
+    QUIZ_SNAPSHOT_LOCAL_CACHE_TTL: float = 5.0
+    QUIZ_SNAPSHOT_LOCAL_CACHE_SIZE: int = 1000
+
+    # cached data lives under <CACHE_NAMESPACE>:v1:...
+    CACHE_NAMESPACE: str = "company_api"
+    CACHE_QUIZ_RESULTS_TTL: int = 172800
 
     CELERY_BROKER_URL: str
     CELERY_RESULT_BACKEND: str
 
+    # directory for the files produced by export jobs; the worker writes them and the API serves them,
+    # so both must see the same directory (docker-compose mounts the shared "exports" volume there)
+    EXPORT_DIR: str = "exports"
+
 
 settings = Settings()
@@ -0,0 +1,28 @@
+"""add_quiz_results_user_answer_index
+
+Revision ID: 5d0b8e3a1f27
+Revises: c41f7a2d9e6b
+Create Date: 2026-10-18 11:40:05.918273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0b8e3a1f27'
+down_revision = 'c41f7a2d9e6b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # grading looks up whether a user answer already has a result
+    with op.get_context().autocommit_block():
+        op.create_index('ix_quiz_results_user_answer_id', 'quiz_results', ['user_answer_id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_quiz_results_user_answer_id', table_name='quiz_results', postgresql_concurrently=True)
@@ -0,0 +1,50 @@
+"""create_score_tables
+
+Revision ID: 9a6e2c4b7d15
+Revises: 5d0b8e3a1f27
+Create Date: 2026-10-18 13:05:47.331590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a6e2c4b7d15'
+down_revision = '5d0b8e3a1f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_scores',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('correct_count', sa.Integer(), nullable=False),
+    sa.Column('total_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('user_quiz_scores',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('correct_count', sa.Integer(), nullable=False),
+    sa.Column('total_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.quiz_id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'quiz_id')
+    )
+
+    # fill the running totals from the results graded so far
+    op.execute(
+        "INSERT INTO user_quiz_scores (user_id, quiz_id, correct_count, total_count) "
+        "SELECT user_id, quiz_id, count(*) FILTER (WHERE result), count(*) FROM quiz_results GROUP BY user_id, quiz_id"
+    )
+    op.execute(
+        "INSERT INTO user_scores (user_id, correct_count, total_count) "
+        "SELECT user_id, sum(correct_count), sum(total_count) FROM user_quiz_scores GROUP BY user_id"
+    )
+
+
+def downgrade():
+    op.drop_table('user_quiz_scores')
+    op.drop_table('user_scores')
@@ -0,0 +1,47 @@
+"""add_lookup_indexes
+
+Revision ID: c41f7a2d9e6b
+Revises: 3989f5a79eee
+Create Date: 2026-10-18 10:12:31.204417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f7a2d9e6b'
+down_revision = '3989f5a79eee'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_notifications_user_id_status', 'notifications', ['user_id', 'status'], None),
+    ('ix_notifications_user_id_timestamp', 'notifications', ['user_id', 'timestamp'], None),
+    ('ix_user_answers_user_id_quiz_id', 'user_answers', ['user_id', 'quiz_id'], None),
+    ('ix_user_answers_user_id_timestamp', 'user_answers', ['user_id', 'timestamp'], None),
+    ('ix_user_answers_question_id', 'user_answers', ['question_id'], None),
+    ('ix_quiz_results_user_id_timestamp', 'quiz_results', ['user_id', 'timestamp'], None),
+    ('ix_quizzes_company_id_active', 'quizzes', ['company_id'], 'is_active'),
+    ('ix_questions_quiz_id', 'questions', ['quiz_id'], None),
+    ('ix_answers_question_id', 'answers', ['question_id'], None),
+    ('ix_company_membership_company_id_is_active', 'company_membership', ['company_id', 'is_active'], None),
+    ('ix_company_requests_company_id_created_by_status', 'company_requests',
+     ['company_id', 'created_by', 'status'], None),
+    ('ix_company_roles_user_id_company_id', 'company_roles', ['user_id', 'company_id'], None),
+]
+
+
+def upgrade():
+    # CONCURRENTLY keeps the tables writable while the indexes are built, it cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True,
+                            postgresql_where=sa.text(where) if where else None)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
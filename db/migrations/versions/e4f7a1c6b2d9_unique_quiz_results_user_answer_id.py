@@ -0,0 +1,40 @@
+"""unique_quiz_results_user_answer_id
+
+Revision ID: e4f7a1c6b2d9
+Revises: 9a6e2c4b7d15
+Create Date: 2026-10-18 15:12:36.204517
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4f7a1c6b2d9'
+down_revision = '9a6e2c4b7d15'
+branch_labels = None
+depends_on = None
+
+
+def _swap_index(unique: bool):
+    # the new index is built next to the old one, so user_answer_id is indexed at every step; a build that
+    # fails (e.g. on a duplicate graded meanwhile) leaves an INVALID index behind, which a rerun drops first
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_quiz_results_user_answer_id_new")
+        if unique:
+            # concurrent gradings could grade the same answer twice, keep the first result of every answer
+            op.execute(
+                "DELETE FROM quiz_results duplicate USING quiz_results kept "
+                "WHERE duplicate.user_answer_id = kept.user_answer_id AND duplicate.result_id > kept.result_id"
+            )
+        op.create_index('ix_quiz_results_user_answer_id_new', 'quiz_results', ['user_answer_id'], unique=unique,
+                        postgresql_concurrently=True)
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_quiz_results_user_answer_id")
+        op.execute("ALTER INDEX ix_quiz_results_user_answer_id_new RENAME TO ix_quiz_results_user_answer_id")
+
+
+def upgrade():
+    _swap_index(unique=True)
+
+
+def downgrade():
+    _swap_index(unique=False)
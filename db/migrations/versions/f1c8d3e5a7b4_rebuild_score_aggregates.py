@@ -0,0 +1,40 @@
+"""rebuild_score_aggregates
+
+Revision ID: f1c8d3e5a7b4
+Revises: e4f7a1c6b2d9
+Create Date: 2026-10-18 15:34:52.810463
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c8d3e5a7b4'
+down_revision = 'e4f7a1c6b2d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the running totals counted every duplicate result removed by e4f7a1c6b2d9, recount them;
+    # gradings wait until the totals match quiz_results again
+    op.execute("LOCK TABLE quiz_results IN SHARE MODE")
+    op.execute("DELETE FROM user_quiz_scores")
+    op.execute(
+        "INSERT INTO user_quiz_scores (user_id, quiz_id, correct_count, total_count) "
+        "SELECT user_id, quiz_id, count(*) FILTER (WHERE result), count(*) FROM quiz_results GROUP BY user_id, quiz_id"
+    )
+    op.execute("DELETE FROM user_scores")
+    op.execute(
+        "INSERT INTO user_scores (user_id, correct_count, total_count) "
+        "SELECT user_id, sum(correct_count), sum(total_count) FROM user_quiz_scores GROUP BY user_id"
+    )
+    op.execute(
+        "UPDATE users SET average_score = user_scores.correct_count "
+        "FROM user_scores WHERE user_scores.user_id = users.user_id"
+    )
+
+
+def downgrade():
+    # one-way: the totals counted from the duplicate results are gone together with those results
+    raise NotImplementedError("f1c8d3e5a7b4 rebuilds the score aggregates in place and cannot be reverted")
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, String, Integer, ForeignKey, Enum, DateTime
+from sqlalchemy import Boolean, Column, String, Integer, ForeignKey, Enum, DateTime, Index, text
 from sqlalchemy.orm import declarative_base, relationship
 from enum import Enum as PyEnum
 from db.session import metadata
@@ -10,6 +10,10 @@ Base = declarative_base(metadata=metadata)
 
 class Notification(Base):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        Index('ix_notifications_user_id_status', 'user_id', 'status'),
+        Index('ix_notifications_user_id_timestamp', 'user_id', 'timestamp'),
+    )
 
     notification_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
@@ -23,6 +27,11 @@ class Notification(Base):
 
 class UserAnswers(Base):
     __tablename__ = 'user_answers'
+    __table_args__ = (
+        Index('ix_user_answers_user_id_quiz_id', 'user_id', 'quiz_id'),
+        Index('ix_user_answers_user_id_timestamp', 'user_id', 'timestamp'),
+        Index('ix_user_answers_question_id', 'question_id'),
+    )
 
     user_answer_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
@@ -45,6 +54,11 @@ class UserAnswers(Base):
 
 class QuizResult(Base):
     __tablename__ = 'quiz_results'
+    __table_args__ = (
+        Index('ix_quiz_results_user_id_timestamp', 'user_id', 'timestamp'),
+        # one result per user answer, concurrent gradings of the same attempt skip the rows already graded
+        Index('ix_quiz_results_user_answer_id', 'user_answer_id', unique=True),
+    )
 
     result_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
@@ -62,8 +76,28 @@ class QuizResult(Base):
     user_answer = relationship("UserAnswers", back_populates="quiz_result")
 
 
+class UserScore(Base):
+    __tablename__ = 'user_scores'
+
+    user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+    correct_count = Column(Integer, nullable=False, default=0)
+    total_count = Column(Integer, nullable=False, default=0)
+
+
+class UserQuizScore(Base):
+    __tablename__ = 'user_quiz_scores'
+
+    user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
+    quiz_id = Column(Integer, ForeignKey('quizzes.quiz_id'), primary_key=True)
+    correct_count = Column(Integer, nullable=False, default=0)
+    total_count = Column(Integer, nullable=False, default=0)
+
+
 class Quiz(Base):
     __tablename__ = 'quizzes'
+    __table_args__ = (
+        Index('ix_quizzes_company_id_active', 'company_id', postgresql_where=text('is_active')),
+    )
 
     quiz_id = Column(Integer, primary_key=True, autoincrement=True)
     company_id = Column(Integer, ForeignKey('companies.company_id'), nullable=False)
@@ -89,6 +123,9 @@ class Quiz(Base):
 
 class Question(Base):
     __tablename__ = 'questions'
+    __table_args__ = (
+        Index('ix_questions_quiz_id', 'quiz_id'),
+    )
 
     question_id = Column(Integer, primary_key=True, autoincrement=True)
     quiz_id = Column(Integer, ForeignKey('quizzes.quiz_id'), nullable=False)
@@ -105,6 +142,9 @@ class Question(Base):
 
 class Answer(Base):
     __tablename__ = 'answers'
+    __table_args__ = (
+        Index('ix_answers_question_id', 'question_id'),
+    )
 
     answer_id = Column(Integer, primary_key=True, autoincrement=True)
     quiz_id = Column(Integer, ForeignKey('quizzes.quiz_id'), nullable=False)
@@ -122,6 +162,9 @@ class Answer(Base):
 
 class CompanyMembership(Base):
     __tablename__ = 'company_membership'
+    __table_args__ = (
+        Index('ix_company_membership_company_id_is_active', 'company_id', 'is_active'),
+    )
 
     user_id = Column(Integer, ForeignKey('users.user_id'), primary_key=True)
     company_id = Column(Integer, ForeignKey('companies.company_id'), primary_key=True)
@@ -143,6 +186,9 @@ class RequestCreatedBy(PyEnum):
 
 class CompanyRequest(Base):
     __tablename__ = 'company_requests'
+    __table_args__ = (
+        Index('ix_company_requests_company_id_created_by_status', 'company_id', 'created_by', 'status'),
+    )
 
     request_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
@@ -164,6 +210,9 @@ class RoleType(PyEnum):
 
 class CompanyRole(Base):
     __tablename__ = 'company_roles'
+    __table_args__ = (
+        Index('ix_company_roles_user_id_company_id', 'user_id', 'company_id'),
+    )
 
     role_id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.user_id'), nullable=False)
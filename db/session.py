@@ -1,31 +1,110 @@
-import asyncio_redis
+import asyncio
+import time
+import itertools
 import config
-from typing import Generator
+import redis.asyncio as aioredis
+from typing import Generator, List, Optional
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import MetaData
-from fastapi import Depends
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import MetaData, event, exc
+from fastapi import Depends, Request
 
+from logger import logger
 
-async def create_redis_connection():
+
+def create_redis_pool(settings: config.Settings = config.settings) -> aioredis.BlockingConnectionPool:
     # Параметри підключення до Redis
-    redis_host = config.settings.REDIS_HOST
-    redis_port = config.settings.REDIS_PORT
+    # a blocking pool waits up to REDIS_POOL_TIMEOUT for a free connection instead of failing when it is exhausted
+    return aioredis.BlockingConnectionPool(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+    )
+
+
+# one pool for the whole process, connections are opened lazily and reused between requests
+redis_pool = create_redis_pool()
+
 
-    redis_connection = await asyncio_redis.Connection.create(host=redis_host, port=redis_port)
-    return redis_connection
+def get_redis() -> aioredis.Redis:
+    """Dependency for getting a Redis client on the shared pool"""
+    return aioredis.Redis(connection_pool=redis_pool)
 
 
 metadata = MetaData()
 
+
+class PoolStatistics:
+    """Counters collected by InstrumentedQueuePool, used to size the pool per uvicorn worker."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float) -> None:
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that measures how long each checkout waits for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statistics = PoolStatistics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.statistics.timeouts += 1
+            raise
+        self.statistics.record(time.perf_counter() - started)
+        return connection
+
+
+def create_engine_from_settings(url: str, settings: config.Settings = config.settings) -> AsyncEngine:
+    """Create the async engine with the pool configured from Settings."""
+    return create_async_engine(
+        url,
+        future=True,
+        echo=settings.DATABASE_ECHO,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DATABASE_MAX_CONNECTIONS,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_recycle=settings.DATABASE_CONNECTION_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        connect_args={"statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE},
+    )
+
+
+def get_pool_statistics(async_engine: AsyncEngine) -> dict:
+    pool = async_engine.pool
+    statistics = getattr(pool, "statistics", None) or PoolStatistics()
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": statistics.checkouts,
+        "timeouts": statistics.timeouts,
+        "avg_wait_ms": statistics.total_wait / statistics.checkouts * 1000 if statistics.checkouts else 0.0,
+        "max_wait_ms": statistics.max_wait * 1000,
+    }
+
+
 # create async engine for interaction with database
-engine = create_async_engine(
-    config.REAL_DATABASE_URL,
-    future=True,
-    echo=True,
-    execution_options={"isolation_level": "AUTOCOMMIT"},
-)
+engine = create_engine_from_settings(config.REAL_DATABASE_URL)
 
 # create session for the interaction with database
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
@@ -42,3 +121,96 @@ async def get_db() -> Generator:
 
 async def get_session(db: Session = Depends(get_db)):
     return db
+
+
+# # READ REPLICAS # #
+READ_PRIMARY_HEADER = "X-Read-Primary"
+READ_PRIMARY_COOKIE = "read_primary_until"
+# session.info flag set on replica sessions, they may lag behind the primary
+READ_REPLICA_KEY = "read_replica"
+
+
+def is_replica_session(session: AsyncSession) -> bool:
+    return session.info.get(READ_REPLICA_KEY, False)
+
+
+class Replica:
+    """One read replica; it is skipped for `retry_interval` seconds after a connection failure."""
+
+    def __init__(self, url: str, retry_interval: int):
+        self.engine = create_engine_from_settings(url)
+        self.session_maker = sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        self.retry_interval = retry_interval
+        self.unhealthy_until = 0.0
+        event.listen(self.engine.sync_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        # a lost connection or a failed connect attempt takes the replica out of rotation
+        if context.is_disconnect or context.connection is None:
+            self.mark_unhealthy()
+
+    def mark_unhealthy(self) -> None:
+        self.unhealthy_until = time.monotonic() + self.retry_interval
+
+    def is_healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+
+class ReplicaRouter:
+    """Hands out replica sessions round-robin, skipping unhealthy replicas."""
+
+    def __init__(self, urls: List[str], retry_interval: int):
+        self.replicas = [Replica(url, retry_interval) for url in urls]
+        self._counter = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._counter) % len(self.replicas)]
+            if replica.is_healthy():
+                return replica
+        return None
+
+
+replica_router = ReplicaRouter(
+    [url.strip() for url in config.settings.DATABASE_REPLICA_URLS.split(",") if url.strip()],
+    config.settings.DATABASE_REPLICA_RETRY_INTERVAL,
+)
+
+
+def must_read_from_primary(request: Request) -> bool:
+    if request.method not in ("GET", "HEAD"):
+        return True
+    if request.headers.get(READ_PRIMARY_HEADER):
+        return True
+    # set by the read-your-writes middleware after a successful write
+    read_primary_until = request.cookies.get(READ_PRIMARY_COOKIE)
+    try:
+        return read_primary_until is not None and float(read_primary_until) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_read_db(request: Request, primary: AsyncSession = Depends(get_db)) -> Generator:
+    """Dependency for getting a session on a read replica, falling back to the primary"""
+    replica = None if must_read_from_primary(request) else replica_router.choose()
+    if replica is None:
+        yield primary
+        return
+    session: AsyncSession = replica.session_maker(info={READ_REPLICA_KEY: True})
+    try:
+        # connect before handing the session out, once the route has read something it is too late to switch
+        await session.connection()
+    except (exc.DBAPIError, OSError, asyncio.TimeoutError) as error:
+        await session.close()
+        replica.mark_unhealthy()
+        logger.warning(f"read replica unavailable, reading from the primary: {error}")
+        yield primary
+        return
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_read_session(db: Session = Depends(get_read_db)):
+    return db
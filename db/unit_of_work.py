@@ -0,0 +1,89 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+
+T = TypeVar("T")
+
+# session.info key holding how many UnitOfWork blocks are currently open on the session
+UNIT_OF_WORK_KEY = "unit_of_work_depth"
+# callbacks to run once the outermost block has committed
+AFTER_COMMIT_KEY = "unit_of_work_after_commit"
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
+
+def in_unit_of_work(session: AsyncSession) -> bool:
+    return session.info.get(UNIT_OF_WORK_KEY, 0) > 0
+
+
+async def after_commit(session: AsyncSession, callback: Callable[[], Awaitable[Any]]) -> None:
+    """Run `callback` once the current writes are committed, e.g. to drop cache entries.
+
+    Outside a UnitOfWork CRUDBase has already committed, so it runs right away; inside one it runs after
+    the outermost block commits, and never if the transaction is rolled back.
+    """
+    if in_unit_of_work(session):
+        session.info.setdefault(AFTER_COMMIT_KEY, []).append(callback)
+    else:
+        await callback()
+
+
+def is_serialization_failure(exc: DBAPIError) -> bool:
+    return getattr(exc.orig, "sqlstate", None) in RETRYABLE_SQLSTATES
+
+
+class UnitOfWork:
+    """Groups every write made through one session into a single transaction.
+
+    While a UnitOfWork is open, CRUDBase only flushes; the outermost block commits on success and
+    rolls back on any exception. Blocks can be nested, only the outermost one ends the transaction.
+
+        async with UnitOfWork(session):
+            await company_crud.create(company)
+            await membership_crud.create(membership)
+    """
+
+    def __init__(self, session: AsyncSession, retries: Optional[int] = None, retry_delay: Optional[float] = None):
+        self.session = session
+        self.retries = config.settings.DATABASE_TRANSACTION_RETRIES if retries is None else retries
+        self.retry_delay = config.settings.DATABASE_TRANSACTION_RETRY_DELAY if retry_delay is None else retry_delay
+
+    async def __aenter__(self) -> "UnitOfWork":
+        self.session.info[UNIT_OF_WORK_KEY] = self.session.info.get(UNIT_OF_WORK_KEY, 0) + 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        depth = self.session.info[UNIT_OF_WORK_KEY] - 1
+        self.session.info[UNIT_OF_WORK_KEY] = depth
+        if depth > 0:
+            return
+        callbacks = self.session.info.pop(AFTER_COMMIT_KEY, [])
+        if exc_type is None:
+            try:
+                await self.session.commit()
+            except Exception:
+                await self.session.rollback()
+                raise
+            for callback in callbacks:
+                await callback()
+        else:
+            await self.session.rollback()
+
+    async def run(self, func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        """Run `func` inside the unit of work, retrying it on serialization failures and deadlocks."""
+        attempt = 0
+        while True:
+            try:
+                async with self:
+                    return await func(*args, **kwargs)
+            except DBAPIError as exc:
+                # only the outermost block may retry, nested ones are part of a larger transaction
+                if in_unit_of_work(self.session) or not is_serialization_failure(exc) or attempt >= self.retries:
+                    raise
+                attempt += 1
+                await asyncio.sleep(self.retry_delay * attempt)
@@ -1,10 +1,17 @@
+import time
+from contextlib import asynccontextmanager
+
 import uvicorn
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.routing import APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
+from utils.serialization import ORJSONResponse
+from utils.hashing import password_hash_executor
+from db.session import engine, get_pool_statistics, replica_router, redis_pool, READ_PRIMARY_COOKIE
 from api.routers.users import users_router
 from api.routers.auth import auth_router
 from api.routers.company import company_router
@@ -12,7 +19,17 @@ from api.routers.quizzes import quiz_router
 from api.routers.analytics import analytics_router
 from api.routers.notifications import notifications_router
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # close the shared pools when the worker stops
+    await redis_pool.disconnect()
+    await engine.dispose()
+    password_hash_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Настройки CORS
 origins = [
@@ -29,6 +46,17 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    # after a successful write the client reads from the primary until the replicas have caught up
+    if replica_router.replicas and request.method not in ("GET", "HEAD") and response.status_code < 400:
+        read_primary_until = time.time() + settings.DATABASE_READ_YOUR_WRITES_SECONDS
+        response.set_cookie(READ_PRIMARY_COOKIE, str(read_primary_until),
+                            max_age=settings.DATABASE_READ_YOUR_WRITES_SECONDS, httponly=True)
+    return response
+
+
 @app.get("/")
 async def health_check():
     response = {
@@ -39,6 +67,16 @@ async def health_check():
     return response
 
 
+@app.get("/health/db_pool")
+async def db_pool_statistics():
+    return get_pool_statistics(engine)
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 # create the instance for the routes
 main_api_router = APIRouter()
 
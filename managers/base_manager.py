@@ -1,8 +1,17 @@
-from typing import TypeVar, Generic, List, Type, Optional, Any
+import base64
+import json
+from datetime import datetime
+from collections import defaultdict
+from typing import TypeVar, Generic, List, Type, Optional, Any, Tuple, Sequence, Dict, Iterable, AsyncIterator
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import cast, String
+from sqlalchemy import (cast, String, DateTime, ARRAY, Row, insert, update, func, any_, bindparam, and_, or_,
+                        true)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import config
+from db.unit_of_work import in_unit_of_work
 
 ModelType = TypeVar("ModelType")
 
@@ -12,6 +21,24 @@ class CRUDBase(Generic[ModelType]):
         self.model = model
         self.session = session
 
+    def _field_filter(self, field_name: str, value: Any, as_string: bool = False):
+        """Build a predicate for one column.
+
+        By default the column is compared in its own type, so Postgres can use the primary key and
+        unique indexes. `as_string=True` keeps the old `CAST(column AS VARCHAR) = 'value'` comparison.
+        """
+        filter_field = getattr(self.model, field_name)
+        if as_string:
+            return cast(filter_field, String) == str(value)
+        return filter_field == value
+
+    def _filters(self, **kwargs: Any) -> list:
+        return [self._field_filter(field_name, value) for field_name, value in kwargs.items()]
+
+    @property
+    def _primary_key(self) -> tuple:
+        return tuple(self.model.__mapper__.primary_key)
+
     async def get_all(self, **kwargs: Optional[Any]) -> List[ModelType]:
         stmt = select(self.model)
         if kwargs:
@@ -19,38 +46,275 @@ class CRUDBase(Generic[ModelType]):
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
-    async def get_by_field(self, model_value, field_name: str) -> ModelType:
-        filter_field = getattr(self.model, field_name)
-        stmt = select(self.model).filter(cast(filter_field, String) == str(model_value))
+    async def count(self, **kwargs: Any) -> int:
+        # count(*) without selecting any columns, so Postgres can answer it from an index
+        stmt = select(func.count()).select_from(self.model).filter(*self._filters(**kwargs))
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
+
+    async def get_page(self, offset: int, limit: int, **kwargs: Any) -> Tuple[List[ModelType], int]:
+        """Return one LIMIT/OFFSET page ordered by the primary key together with the total row count."""
+        stmt = (select(self.model).filter(*self._filters(**kwargs))
+                .order_by(*self._primary_key).offset(offset).limit(limit))
+        result = await self.session.execute(stmt)
+        items = result.scalars().all()
+        # a short first page already tells the total
+        if offset == 0 and len(items) < limit:
+            return items, len(items)
+        return items, await self.count(**kwargs)
+
+    async def stream(self, yield_per: Optional[int] = None, order_by: Sequence[str] = (),
+                     **kwargs: Any) -> AsyncIterator[ModelType]:
+        """Iterate over the matching rows through a server-side cursor.
+
+        Rows are fetched `yield_per` at a time, so walking a very large table keeps memory flat as long
+        as the caller does not hold on to the objects.
+        """
+        yield_per = yield_per or config.settings.DATABASE_STREAM_YIELD_PER
+        stmt = select(self.model).filter(*self._filters(**kwargs))
+        if order_by:
+            stmt = stmt.order_by(*(getattr(self.model, field_name) for field_name in order_by))
+        result = await self.session.stream_scalars(stmt.execution_options(yield_per=yield_per))
+        async for obj in result:
+            yield obj
+
+    def _cursor_columns(self, order_by: Sequence[str]) -> list:
+        # the primary key is always appended, so the ordering is unique and no row is skipped or repeated
+        columns = [getattr(self.model, field_name) for field_name in order_by]
+        names = {column.key for column in columns}
+        return columns + [column for column in self._primary_key if column.key not in names]
+
+    @staticmethod
+    def _cursor_order(columns: Sequence[Any], descending: bool) -> list:
+        # NULL sorts above every value in both directions, the way the btree indexes store it
+        return [column.desc().nulls_first() if descending else column.asc().nulls_last() for column in columns]
+
+    @staticmethod
+    def _after_cursor(columns: Sequence[Any], values: Sequence[Any], descending: bool):
+        """The rows that come after `values` in _cursor_order, one column at a time from the last one."""
+        condition = None
+        for column, value in reversed(list(zip(columns, values))):
+            if condition is None:
+                # the primary key, never NULL
+                condition = column < value if descending else column > value
+            elif value is None:
+                # NULLs come first when descending: every non-NULL value is still ahead
+                condition = (or_(column.is_not(None), and_(column.is_(None), condition)) if descending
+                             else and_(column.is_(None), condition))
+            elif descending:
+                condition = and_(column <= value, or_(column < value, condition))
+            else:
+                condition = or_(column > value, column.is_(None), and_(column == value, condition))
+        return condition if condition is not None else true()
+
+    @staticmethod
+    def encode_cursor(values: Sequence[Any]) -> str:
+        payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str, columns: Sequence[Any]) -> list:
+        """Decode a cursor made by encode_cursor, raises ValueError when it does not fit the columns."""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError) as exc:
+            raise ValueError("Invalid cursor") from exc
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("Invalid cursor")
+        return [CRUDBase._decode_cursor_value(value, column) for value, column in zip(values, columns)]
+
+    @staticmethod
+    def _decode_cursor_value(value: Any, column: Any) -> Any:
+        # a forged cursor must not reach the database as a value of the wrong type
+        if value is None:
+            if not column.nullable:
+                raise ValueError("Invalid cursor")
+            return None
+        if isinstance(column.type, DateTime):
+            if not isinstance(value, str):
+                raise ValueError("Invalid cursor")
+            return datetime.fromisoformat(value)
+        python_type = column.type.python_type
+        # JSON has no separate bool, True is an int to isinstance
+        if isinstance(value, bool) and python_type is not bool:
+            raise ValueError("Invalid cursor")
+        if python_type is float and isinstance(value, int):
+            return float(value)
+        if not isinstance(value, python_type):
+            raise ValueError("Invalid cursor")
+        return value
+
+    async def get_cursor_page(self, cursor: Optional[str], limit: int, order_by: Sequence[str] = (),
+                              descending: bool = False, **kwargs: Any) -> Tuple[List[ModelType], Optional[str]]:
+        """Keyset page ordered by `order_by` plus the primary key.
+
+        Returns the rows and an opaque cursor for the next page (None on the last page). Every page
+        costs one index range scan, however deep it is.
+        """
+        columns = self._cursor_columns(order_by)
+        stmt = select(self.model).filter(*self._filters(**kwargs))
+        if cursor:
+            stmt = stmt.filter(self._after_cursor(columns, self.decode_cursor(cursor, columns), descending))
+        result = await self.session.execute(stmt.order_by(*self._cursor_order(columns, descending))
+                                            .limit(limit + 1))
+        items = result.scalars().all()
+        if len(items) <= limit:
+            return items, None
+        items = items[:limit]
+        return items, self.encode_cursor([getattr(items[-1], column.key) for column in columns])
+
+    async def get_by_pk(self, pk: Any) -> Optional[ModelType]:
+        # session.get looks in the identity map first and only hits the database on a miss
+        return await self.session.get(self.model, pk)
+
+    async def get_by_field(self, model_value, field_name: str, as_string: bool = False) -> ModelType:
+        stmt = select(self.model).filter(self._field_filter(field_name, model_value, as_string))
         try:
             result = await self.session.execute(stmt)
             return result.scalar_one()
         except NoResultFound:
             return None
 
-    async def get_by_fields(self, **kwargs: Any) -> Optional[ModelType]:
+    async def get_by_fields(self, as_string: bool = False, **kwargs: Any) -> Optional[ModelType]:
         stmt = select(self.model)
         for field_name, value in kwargs.items():
-            filter_field = getattr(self.model, field_name)
-            stmt = stmt.filter(cast(filter_field, String) == str(value))
+            stmt = stmt.filter(self._field_filter(field_name, value, as_string))
         try:
             result = await self.session.execute(stmt)
             return result.scalar_one()
         except NoResultFound:
             return None
 
-    async def create(self, obj: ModelType) -> ModelType:
+    async def _save(self, commit: bool) -> None:
+        # flush still sends the INSERTs and fills in generated keys, but leaves the commit to the caller;
+        # inside a UnitOfWork the commit always belongs to the outermost block
+        if commit and not in_unit_of_work(self.session):
+            await self.session.commit()
+        else:
+            await self.session.flush()
+
+    def _in_filter(self, values: List[Any], field_name: str):
+        # one array parameter (`column = ANY($1)`) instead of a placeholder per value
+        filter_field = getattr(self.model, field_name)
+        return filter_field == any_(bindparam(f"{field_name}_values", values, type_=ARRAY(filter_field.type)))
+
+    async def _get_in(self, values: Iterable[Any], field_name: str) -> List[ModelType]:
+        values = list(set(values))
+        if not values:
+            return []
+        result = await self.session.execute(select(self.model).filter(self._in_filter(values, field_name)))
+        return result.scalars().all()
+
+    async def get_many(self, values: Iterable[Any], field_name: str) -> Dict[Any, ModelType]:
+        """Fetch the rows for many values of a unique field in one query, keyed by that value."""
+        return {getattr(obj, field_name): obj for obj in await self._get_in(values, field_name)}
+
+    async def get_many_grouped(self, values: Iterable[Any], field_name: str) -> Dict[Any, List[ModelType]]:
+        """Like get_many for a non-unique field: every value maps to the list of its rows."""
+        grouped = defaultdict(list)
+        for obj in await self._get_in(values, field_name):
+            grouped[getattr(obj, field_name)].append(obj)
+        return dict(grouped)
+
+    def _select_columns(self, field_names: Sequence[str]):
+        return select(*(getattr(self.model, field_name) for field_name in field_names))
+
+    async def get_columns(self, field_names: Sequence[str], **kwargs: Any) -> List[Row]:
+        """Select only the given columns as named rows (row.quiz_id), without building ORM objects."""
+        stmt = self._select_columns(field_names).filter(*self._filters(**kwargs))
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def get_columns_in(self, field_names: Sequence[str], values: Iterable[Any], field_name: str) -> List[Row]:
+        """get_columns for the rows whose `field_name` is any of `values`."""
+        values = list(set(values))
+        if not values:
+            return []
+        result = await self.session.execute(self._select_columns(field_names).filter(self._in_filter(values, field_name)))
+        return result.all()
+
+    async def stream_columns(self, field_names: Sequence[str], yield_per: Optional[int] = None,
+                             order_by: Sequence[str] = (), **kwargs: Any) -> AsyncIterator[Row]:
+        """Streaming variant of get_columns, see stream()."""
+        yield_per = yield_per or config.settings.DATABASE_STREAM_YIELD_PER
+        stmt = self._select_columns(field_names).filter(*self._filters(**kwargs))
+        if order_by:
+            stmt = stmt.order_by(*(getattr(self.model, field_name) for field_name in order_by))
+        result = await self.session.stream(stmt.execution_options(yield_per=yield_per))
+        async for row in result:
+            yield row
+
+    async def create(self, obj: ModelType, commit: bool = True) -> ModelType:
         self.session.add(obj)
-        await self.session.commit()
+        await self._save(commit)
         return obj
 
+    async def create_many(self, objs: List[ModelType], commit: bool = True) -> List[ModelType]:
+        """Insert a batch of ORM objects with one commit.
+
+        SQLAlchemy groups the pending rows of one table into a multi-row INSERT ... RETURNING,
+        so the generated primary keys are set on every object afterwards.
+        """
+        self.session.add_all(objs)
+        await self._save(commit)
+        return objs
+
+    async def bulk_insert(self, values: List[dict], commit: bool = True) -> List[ModelType]:
+        """Insert plain column dicts in a single INSERT ... RETURNING and return the created objects."""
+        created = []
+        if values:
+            result = await self.session.scalars(insert(self.model).returning(self.model), values)
+            created = result.all()
+        await self._save(commit)
+        return created
+
+    async def insert_from_select(self, field_names: Sequence[str], select_stmt, commit: bool = True,
+                                 conflict_fields: Sequence[str] = ()) -> List[ModelType]:
+        """Run INSERT INTO <table> (field_names) SELECT ... RETURNING * and return the created objects.
+
+        With `conflict_fields`, rows that collide with an existing row on that unique index are skipped
+        (ON CONFLICT DO NOTHING), and only the rows actually inserted are returned.
+        """
+        stmt = pg_insert(self.model).from_select(list(field_names), select_stmt)
+        if conflict_fields:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_fields))
+        stmt = stmt.returning(self.model)
+        result = await self.session.scalars(stmt)
+        created = result.all()
+        await self._save(commit)
+        return created
+
+    async def upsert_increment(self, rows: List[dict], index_fields: Sequence[str], increment_fields: Sequence[str],
+                               commit: bool = True) -> None:
+        """Insert counter rows, or atomically add them to the existing row with the same key.
+
+        INSERT ... ON CONFLICT (index_fields) DO UPDATE SET field = table.field + EXCLUDED.field
+        """
+        if rows:
+            stmt = pg_insert(self.model).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(index_fields),
+                set_={field_name: getattr(self.model, field_name) + getattr(stmt.excluded, field_name)
+                      for field_name in increment_fields},
+            )
+            await self.session.execute(stmt)
+        await self._save(commit)
+
+    async def increment(self, pk: Any, commit: bool = True, **deltas: int) -> None:
+        """UPDATE ... SET field = field + delta on one row, without reading it first."""
+        primary_key, = self._primary_key
+        stmt = (update(self.model).where(primary_key == pk)
+                .values({field_name: getattr(self.model, field_name) + delta for field_name, delta in deltas.items()}))
+        await self.session.execute(stmt)
+        await self._save(commit)
+
     async def update(self, obj: ModelType, update_data: dict) -> ModelType:
         for key, value in update_data.items():
             setattr(obj, key, value)
         merged_obj = await self.session.merge(obj)
-        await self.session.commit()
+        await self._save(commit=True)
         return merged_obj
 
     async def delete(self, obj: ModelType):
         await self.session.delete(obj)
-        await self.session.commit()
+        await self._save(commit=True)
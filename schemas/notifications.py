@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -12,7 +13,7 @@ class TunedModel(BaseModel):
 class NotificationBase(TunedModel):
     notification_id: int
     user_id: int
-    timestamp: datetime
+    timestamp: Optional[datetime]
     status: bool
     text: str
 
@@ -56,6 +56,8 @@ class QuizResultBase(TunedModel):
 
 class QuizResultCreate(BaseModel):
     user_id: int
+    # grade only the answers of this quiz, all ungraded answers of the user when omitted
+    quiz_id: Optional[int] = None
 
 
 # # # USER ANSWERS # # #
@@ -95,3 +97,11 @@ class QuizResultResponse(QuizResultBase):
 class UserAnswersResponse(UserAnswersBase):
     pass
 
+
+
+class ExportJobResponse(BaseModel):
+    job_id: str
+    status: str
+    rows: Optional[int] = None
+    total: Optional[int] = None
+    error: Optional[str] = None
@@ -1,16 +1,21 @@
-from typing import List
+from typing import List, Dict, Optional
+
+import redis.asyncio as aioredis
 
 from fastapi import HTTPException
 from datetime import date
 from sqlalchemy.ext.asyncio import AsyncSession
 from db.models.models import (Answer, Company, User, CompanyMembership, CompanyRequest, CompanyRole, Quiz, QuizResult,
-                              Question, UserAnswers)
+                              Question, UserAnswers, UserScore, UserQuizScore)
 from managers.base_manager import CRUDBase
+from services.principal import Principal, PrincipalResolver
+from utils.cache import QuizResultsCache, CachedQuizResult
 
 class AnalyticsService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, redis: aioredis.Redis):
         self.company_crud = CRUDBase[Company](Company, session)
         self.user_crud = CRUDBase[User](User, session)
+        self.principal_resolver = PrincipalResolver(session, redis)
         self.membership_crud = CRUDBase[CompanyMembership](CompanyMembership, session)
         self.company_request_crud = CRUDBase[CompanyRequest](CompanyRequest, session)
         self.company_role_crud = CRUDBase[CompanyRole](CompanyRole, session)
@@ -19,15 +24,18 @@ class AnalyticsService:
         self.question_crud = CRUDBase[Question](Question, session)
         self.answers_crud = CRUDBase[Answer](Answer, session)
         self.user_answer_crud = CRUDBase[UserAnswers](UserAnswers, session)
+        self.user_score_crud = CRUDBase[UserScore](UserScore, session)
+        self.user_quiz_score_crud = CRUDBase[UserQuizScore](UserQuizScore, session)
+        self.quiz_results_cache = QuizResultsCache(redis, self.quiz_result_crud)
 
-    async def find_auth_user_by_email(self, user_email: str) -> User:
-        return await self.user_crud.get_by_field(user_email, field_name='email')
+    async def find_auth_user_by_email(self, user_email: str) -> Optional[Principal]:
+        return await self.principal_resolver.resolve(user_email)
 
     async def find_user_by_user_id(self, user_id: int) -> User:
-        return await self.user_crud.get_by_field(user_id, field_name='user_id')
+        return await self.user_crud.get_by_pk(user_id)
 
     async def find_company_by_company_id(self, company_id: int) -> Company:
-        return await self.company_crud.get_by_field(company_id, field_name='company_id')
+        return await self.company_crud.get_by_pk(company_id)
 
     async def find_all_company_members_by_company_id(self, company_id: int) -> List[CompanyMembership]:
         return await self.membership_crud.get_all(company_id=company_id)
@@ -35,17 +43,37 @@ class AnalyticsService:
     async def find_user_in_company(self, company_id: int, user_id: int) -> CompanyMembership:
         return await self.membership_crud.get_by_fields(company_id=company_id, user_id=user_id)
 
-    async def find_users_results_by_user_id(self, user_id: int) -> List[QuizResult]:
-        return await self.quiz_result_crud.get_all(user_id=user_id)
+    async def find_users_results_by_user_id(self, user_id: int) -> List[CachedQuizResult]:
+        # the same cached results the export reads, the database is only queried on a miss
+        return await self.quiz_results_cache.get(user_id)
+
+    async def find_results_by_user_ids(self, user_ids: List[int]) -> Dict[int, List[CachedQuizResult]]:
+        return await self.quiz_results_cache.get_many(user_ids)
 
     async def find_user_result_by_user_id(self, user_id: int) -> QuizResult:
         return await self.quiz_result_crud.get_by_field(user_id, field_name="user_id")
 
     async def get_self_rating(self, user_email: str) -> int:
-        user = await self.find_auth_user_by_email(user_email)
+        # average_score changes on every grading, so it is read from the users row and not the principal
+        user = await self.user_crud.get_by_field(user_email, field_name='email')
         user_rating = user.average_score
         return user_rating
 
+    async def get_self_score_summary(self, user_email: str) -> dict:
+        user = await self.find_auth_user_by_email(user_email)
+        if not user:
+            raise HTTPException(status_code=404, detail="No user found")
+
+        # running totals maintained on grading, independent of the length of the history
+        user_score = await self.user_score_crud.get_by_pk(user.user_id)
+        quiz_scores = await self.user_quiz_score_crud.get_all(user_id=user.user_id)
+        return {
+            "correct_count": user_score.correct_count if user_score else 0,
+            "total_count": user_score.total_count if user_score else 0,
+            "quizzes": [{"quiz_id": quiz_score.quiz_id, "correct_count": quiz_score.correct_count,
+                         "total_count": quiz_score.total_count} for quiz_score in quiz_scores],
+        }
+
     async def get_user_rating_by_all_quizzes_by_date(self, user_email: str, start_date: date, end_date: date) -> List[dict]:
         user = await self.find_auth_user_by_email(user_email)
         if not user:
@@ -55,24 +83,20 @@ class AnalyticsService:
         if not quiz_results:
             raise HTTPException(status_code=404, detail="No quiz found")
 
-        filtered_results = [result for result in quiz_results if start_date <= result.timestamp.date() <= end_date]
-
-        unique_quiz_ids = set(result.quiz_id for result in filtered_results)
-
-        average_scores = []
+        true_counts = {}
+        for result in quiz_results:
+            if start_date <= result.timestamp.date() <= end_date:
+                true_counts[result.quiz_id] = true_counts.get(result.quiz_id, 0) + result.result
 
-        for quiz_id in unique_quiz_ids:
-            true_count = sum(result.result for result in filtered_results if result.quiz_id == quiz_id)
-            average_scores.append({"quiz": quiz_id, "average_count": true_count})
+        average_scores = [{"quiz": quiz_id, "average_count": true_count} for quiz_id, true_count in true_counts.items()]
 
         return average_scores
 
     async def get_quizzes_and_last_completion_time(self, user_email: str) -> List[dict]:
         user = await self.find_auth_user_by_email(user_email)
-        quizzes = await self.find_users_results_by_user_id(user_id=user.user_id)
         quiz_completion_times = {}
 
-        for quiz in quizzes:
+        for quiz in await self.find_users_results_by_user_id(user.user_id):
             quiz_id = quiz.quiz_id
             timestamp = quiz.timestamp
             if quiz_id in quiz_completion_times:
@@ -85,12 +109,13 @@ class AnalyticsService:
 
     async def company_get_average_scores(self, company_id: int, start_date: date, end_date: date) -> List[dict]:
         company_members = await self.find_all_company_members_by_company_id(company_id)
+        results_by_user = await self.find_results_by_user_ids([member.user_id for member in company_members])
 
         average_scores = []
 
         for member in company_members:
             user_id = member.user_id
-            quiz_results = await self.find_users_results_by_user_id(user_id)
+            quiz_results = results_by_user.get(user_id)
             if not quiz_results:
                 continue
 
@@ -131,11 +156,12 @@ class AnalyticsService:
 
     async def company_get_all_users_and_last_completion_time(self, company_id: int) -> List[dict]:
         company_members = await self.find_all_company_members_by_company_id(company_id)
+        results_by_user = await self.find_results_by_user_ids([member.user_id for member in company_members])
 
         user_completion_times = {}
 
         for member in company_members:
-            users_results = await self.find_users_results_by_user_id(user_id=member.user_id)
+            users_results = results_by_user.get(member.user_id)
             if not users_results:
                 continue
             last_completion_time = max(result.timestamp for result in users_results)
@@ -14,10 +14,6 @@ class AuthService:
         user = await self.user_crud.get_by_field(email, "email")
         if user is None:
             return
-        if not Hasher.verify_password(password, user.hashed_password):
+        if not await Hasher.verify_password_async(password, user.hashed_password):
             return
         return user
-
-    async def get_user_by_email_for_auth(self, email: str) -> User:
-        user = await self.user_crud.get_by_field(email, "email")
-        return user
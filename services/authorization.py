@@ -0,0 +1,189 @@
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import and_, exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from config import settings
+from db.models.models import Company, CompanyMembership, CompanyRole, RoleType
+from db.session import is_replica_session
+from logger import logger
+from utils import serialization
+from utils.cache import TTLCache, cache_key, cache_requests, cache_errors
+
+local_company_access = TTLCache(maxsize=settings.AUTHZ_LOCAL_CACHE_SIZE, ttl=settings.AUTHZ_LOCAL_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class CompanyAccess:
+    """What one user may do in one existing company."""
+    role_type: Optional[RoleType]
+    is_member: bool
+
+    @property
+    def is_admin_or_owner(self) -> bool:
+        return self.role_type in (RoleType.OWNER, RoleType.ADMIN)
+
+
+def company_access_key(company_id: int, user_id: int) -> str:
+    return cache_key("company_access", company_id, user_id)
+
+
+def membership_version_key(user_id: int) -> str:
+    return cache_key("membership_version", user_id)
+
+
+def shared_company_key(user_id: int, other_user_id: int) -> str:
+    # the relation is symmetric, one entry serves both directions
+    return cache_key("shared_company", *sorted((user_id, other_user_id)))
+
+
+def is_shared_company_key_of(key: Any, user_id: int) -> bool:
+    prefix = cache_key("shared_company", "")
+    return isinstance(key, str) and key.startswith(prefix) and str(user_id) in key[len(prefix):].split(":")
+
+
+class CompanyAccessResolver:
+    """(user, company) -> CompanyAccess in one joined query, cached in the process LRU and in Redis.
+
+    Every Redis entry carries the membership versions of the users it is about, read before the database;
+    invalidate() bumps the user's version whenever a role or a membership changes, so an entry loaded
+    before the change was committed is never served, even if it is written after the invalidation. Other
+    workers may keep their local copy for up to AUTHZ_LOCAL_CACHE_TTL seconds.
+
+    A replica may not have the latest change yet: on a replica session the caches are read, never filled.
+    """
+
+    def __init__(self, session: AsyncSession, redis: aioredis.Redis):
+        self.session = session
+        self.redis = redis
+        self.fills_cache = not is_replica_session(session)
+
+    async def get(self, user_id: int, company_id: int) -> Optional[CompanyAccess]:
+        """Return None when the company does not exist."""
+        key = company_access_key(company_id, user_id)
+        access = local_company_access.get(key)
+        if access is not None:
+            cache_requests.labels("company_access", "local_hit").inc()
+            return access
+
+        stamp = None
+        try:
+            version, cached = await self.redis.mget([membership_version_key(user_id), key])
+            stamp = int(version or 0)
+        except RedisError as exc:
+            cache_errors.labels("company_access").inc()
+            logger.warning(f"company_access cache unavailable: {exc}")
+            cached = None
+        entry = serialization.loads(cached) if cached is not None else None
+        # entries written before they carried a stamp count as stale
+        if entry is not None and len(entry) == 3:
+            cached_stamp, role_type, is_member = entry
+            if cached_stamp == stamp:
+                cache_requests.labels("company_access", "hit").inc()
+                access = CompanyAccess(RoleType(role_type) if role_type else None, is_member)
+                local_company_access.set(key, access)
+                return access
+
+        cache_requests.labels("company_access", "miss").inc()
+        access = await self._load(user_id, company_id)
+        # a missing company is not cached, it may be created right after
+        if access is not None and self.fills_cache:
+            local_company_access.set(key, access)
+            if stamp is not None:
+                try:
+                    await self.redis.set(key, serialization.dumps(
+                        [stamp, access.role_type.value if access.role_type else None, access.is_member]),
+                        ex=settings.AUTHZ_CACHE_TTL)
+                except RedisError as exc:
+                    cache_errors.labels("company_access").inc()
+                    logger.warning(f"company_access cache unavailable: {exc}")
+        return access
+
+    async def _load(self, user_id: int, company_id: int) -> Optional[CompanyAccess]:
+        stmt = (
+            select(Company.company_id, CompanyRole.role_type, CompanyMembership.is_active)
+            .select_from(Company)
+            .outerjoin(CompanyRole, and_(CompanyRole.company_id == Company.company_id,
+                                         CompanyRole.user_id == user_id, CompanyRole.is_active == True))
+            .outerjoin(CompanyMembership, and_(CompanyMembership.company_id == Company.company_id,
+                                               CompanyMembership.user_id == user_id))
+            .filter(Company.company_id == company_id)
+            .limit(1)
+        )
+        row = (await self.session.execute(stmt)).first()
+        if row is None:
+            return None
+        return CompanyAccess(row.role_type, bool(row.is_active))
+
+    async def belongs_to_company(self, user_id: int, company_id: int) -> bool:
+        """Whether the user has an active membership in the company."""
+        access = await self.get(user_id, company_id)
+        return access is not None and access.is_member
+
+    async def shares_active_company(self, user_id: int, other_user_id: int) -> bool:
+        """Whether both users have an active membership in at least one common company."""
+        key = shared_company_key(user_id, other_user_id)
+        shared = local_company_access.get(key)
+        if shared is not None:
+            cache_requests.labels("shared_company", "local_hit").inc()
+            return shared
+
+        stamp = None
+        try:
+            first_version, second_version, cached = await self.redis.mget(
+                [membership_version_key(min(user_id, other_user_id)),
+                 membership_version_key(max(user_id, other_user_id)), key])
+            stamp = f"{int(first_version or 0)}.{int(second_version or 0)}"
+        except RedisError as exc:
+            cache_errors.labels("shared_company").inc()
+            logger.warning(f"shared_company cache unavailable: {exc}")
+            cached = None
+        if cached is not None:
+            cached_stamp, shared = serialization.loads(cached)
+            if cached_stamp == stamp:
+                cache_requests.labels("shared_company", "hit").inc()
+                local_company_access.set(key, shared)
+                return shared
+
+        cache_requests.labels("shared_company", "miss").inc()
+        shared = await self._load_shared(user_id, other_user_id)
+        if not self.fills_cache:
+            return shared
+        local_company_access.set(key, shared)
+        if stamp is not None:
+            try:
+                await self.redis.set(key, serialization.dumps([stamp, shared]), ex=settings.AUTHZ_CACHE_TTL)
+            except RedisError as exc:
+                cache_errors.labels("shared_company").inc()
+                logger.warning(f"shared_company cache unavailable: {exc}")
+        return shared
+
+    async def _load_shared(self, user_id: int, other_user_id: int) -> bool:
+        membership, other_membership = aliased(CompanyMembership), aliased(CompanyMembership)
+        stmt = select(exists().where(
+            membership.user_id == user_id, membership.is_active == True,
+            other_membership.user_id == other_user_id, other_membership.is_active == True,
+            other_membership.company_id == membership.company_id,
+        ))
+        return bool((await self.session.execute(stmt)).scalar())
+
+    async def invalidate(self, user_id: int, company_id: int) -> None:
+        key = company_access_key(company_id, user_id)
+        local_company_access.pop(key)
+        # the Redis entries turn stale with the version below, the local ones have no stamp to check
+        local_company_access.pop_where(partial(is_shared_company_key_of, user_id=user_id))
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                # every cached shares_active_company answer involving this user becomes stale
+                pipe.incr(membership_version_key(user_id))
+                pipe.expire(membership_version_key(user_id), 2 * settings.AUTHZ_CACHE_TTL)
+                await pipe.execute()
+        except RedisError as exc:
+            cache_errors.labels("company_access").inc()
+            logger.warning(f"company_access cache unavailable: {exc}")
@@ -1,5 +1,8 @@
 from fastapi import HTTPException, status
-from typing import List, Dict
+from functools import partial
+from typing import List, Dict, Tuple, Optional
+
+import redis.asyncio as aioredis
 
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -9,28 +12,45 @@ from db.models.models import (Company, User, CompanyMembership, CompanyRequest,
 from schemas.company import (CompanyCreate, UpdateCompany, UpdateCompanyMembershipRequest, UserLeaveCompanyRequest,
                              UpdateCompanyRequest, UpdateCompanyRoleRequest)
 from managers.base_manager import CRUDBase
+from db.unit_of_work import UnitOfWork, after_commit
+from services.authorization import CompanyAccessResolver
+from services.principal import Principal, PrincipalResolver
 from schemas.users import ShowUser
 
 
 class CompanyService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, redis: aioredis.Redis):
         self.company_crud = CRUDBase[Company](Company, session)
         self.user_crud = CRUDBase[User](User, session)
+        self.principal_resolver = PrincipalResolver(session, redis)
         self.membership_crud = CRUDBase[CompanyMembership](CompanyMembership, session)
         self.company_request_crud = CRUDBase[CompanyRequest](CompanyRequest, session)
         self.company_role_crud = CRUDBase[CompanyRole](CompanyRole, session)
+        self.unit_of_work = UnitOfWork(session)
+        self.company_access = CompanyAccessResolver(session, redis)
+        self.session = session
 
     async def get_all_companies(self) -> List[Company]:
         return await self.company_crud.get_all()
 
+    async def get_companies_page(self, offset: int, limit: int) -> Tuple[List[Company], int]:
+        return await self.company_crud.get_page(offset, limit)
+
     async def get_company_by_id(self, company_id: int) -> Company:
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
+        company = await self.company_crud.get_by_pk(company_id)
         return company
 
+    async def find_auth_user_by_email(self, email: str) -> Optional[Principal]:
+        return await self.principal_resolver.resolve(email)
+
     # # BLOCK OWNER # #
     async def create_company(self, company_data: CompanyCreate, email: str) -> Company:
+        # company, owner membership and owner role are written in one transaction
+        return await self.unit_of_work.run(self._create_company, company_data, email)
+
+    async def _create_company(self, company_data: CompanyCreate, email: str) -> Company:
         # find user
-        user = await self.user_crud.get_by_field(email, field_name='email')
+        user = await self.find_auth_user_by_email(email)
         # create company
         company = Company(name=company_data.name, description=company_data.description,
                           visibility=company_data.visibility,
@@ -47,9 +67,9 @@ class CompanyService:
     async def update_company(self, company_data: UpdateCompany, company_id: int,
                              email: str) -> Company:
         # find user
-        user = await self.user_crud.get_by_field(email, field_name='email')
+        user = await self.find_auth_user_by_email(email)
         # find company
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
+        company = await self.company_crud.get_by_pk(company_id)
         if user.user_id != company.owner_id:
             raise HTTPException(status_code=403, detail="Forbidden to update")
 
@@ -58,10 +78,10 @@ class CompanyService:
 
     async def deactivate_company(self, company_id: int, email: str) -> Company:
         # find auth_user by email
-        user = await self.user_crud.get_by_field(email, field_name='email')
+        user = await self.find_auth_user_by_email(email)
 
         # find company
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
+        company = await self.company_crud.get_by_pk(company_id)
         if user.user_id != company.owner_id:
             raise HTTPException(status_code=403, detail="Forbidden to update")
 
@@ -71,49 +91,47 @@ class CompanyService:
 
         return deactivated_company
 
+    async def invalidate_company_access(self, user_id: int, company_id: int) -> None:
+        # dropped only after the role or membership change is committed
+        await after_commit(self.session, partial(self.company_access.invalidate, user_id, company_id))
+
     # # FIND WHO USER IN COMPANY # #
     async def check_who_this_user_in_company_admin_or_owner_by_company_id(self, email: str, company_id: int) -> None:
         # Find auth_user by email
-        auth_user = await self.user_crud.get_by_field(email, field_name='email')
+        auth_user = await self.find_auth_user_by_email(email)
+        if not auth_user:
+            raise HTTPException(status_code=403, detail="Forbidden to update")
 
-        # Find company
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
-        if not company:
+        # company and user role in one cached lookup
+        access = await self.company_access.get(auth_user.user_id, company_id)
+        if access is None:
             raise HTTPException(status_code=404, detail="Not found company_id")
 
-        # Find user role in company
-        role_in_company = await self.company_role_crud.get_by_fields(user_id=auth_user.user_id,
-                                                                     company_id=company.company_id)
-
         # Check role for company
-        if role_in_company.role_type not in [RoleType.OWNER, RoleType.ADMIN]:
+        if not access.is_admin_or_owner:
             raise HTTPException(status_code=403, detail="Forbidden to update")
 
     async def check_who_this_user_in_company_admin_or_owner_by_request_id(self, email: str, request_id: int) -> None:
         # Find auth_user by email
-        auth_user = await self.user_crud.get_by_field(email, field_name='email')
+        auth_user = await self.find_auth_user_by_email(email)
 
         # Find request if request_id is not None
-        request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        request = await self.company_request_crud.get_by_pk(request_id)
         if not request:
             raise HTTPException(status_code=404, detail="Not found request_id")
 
-        # Find company using a request_id
-        company = await self.company_crud.get_by_field(request.company_id, field_name='company_id')
-        if not company:
+        # Find company and user role in company using a request_id
+        access = await self.company_access.get(auth_user.user_id, request.company_id)
+        if access is None:
             raise HTTPException(status_code=404, detail="Not found company for the given request_id")
 
-        # Find user role in company
-        role_in_company = await self.company_role_crud.get_by_fields(user_id=auth_user.user_id,
-                                                                     company_id=company.company_id)
-
         # Check role for company
-        if role_in_company.role_type not in [RoleType.OWNER, RoleType.ADMIN]:
+        if not access.is_admin_or_owner:
             raise HTTPException(status_code=403, detail="Forbidden to update")
 
     async def check_user_not_in_company_membership_by_user_id(self, company_id: int, user_id: int) -> None:
         # Find company
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
+        company = await self.company_crud.get_by_pk(company_id)
         if not company:
             raise HTTPException(status_code=404, detail="Not found company_id")
 
@@ -134,7 +152,7 @@ class CompanyService:
     # # Deactivated REQUEST # #
     async def company_deactivated_request_to_user(self, request_id: int) -> CompanyRequest:
         # find request
-        request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        request = await self.company_request_crud.get_by_pk(request_id)
         if not request:
             raise HTTPException(status_code=404, detail="Not found request")
 
@@ -145,14 +163,14 @@ class CompanyService:
 
     async def company_update_company_request(self, request_id: int, request_data: UpdateCompanyRequest) -> Company:
         # find request
-        request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        request = await self.company_request_crud.get_by_pk(request_id)
         # update request
         updated_company_request = await self.company_request_crud.update(request, request_data.dict())
         return updated_company_request
 
     async def check_user_in_company_by_request_id(self, request_id: int) -> None:
         # Find request
-        request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        request = await self.company_request_crud.get_by_pk(request_id)
         if not request:
             raise HTTPException(status_code=404, detail="Not found request")
 
@@ -170,19 +188,24 @@ class CompanyService:
 
     async def accepted_or_declined_user_request(self, request_id: int, request_data: UpdateCompanyRequest) -> None:
         # Find request
-        request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        request = await self.company_request_crud.get_by_pk(request_id)
         # Update request
         await self.company_request_crud.update(request, request_data.dict())
 
     async def company_add_user_to_membership(self, request_id: int) -> None:
+        # membership and role are written in one transaction
+        await self.unit_of_work.run(self._company_add_user_to_membership, request_id)
+
+    async def _company_add_user_to_membership(self, request_id: int) -> None:
         # Find request
-        request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        request = await self.company_request_crud.get_by_pk(request_id)
         # add user to CompanyMembership
         company_member = CompanyMembership(user_id=request.user_id, company_id=request.company_id)
         await self.membership_crud.create(company_member)
         company_role = CompanyRole(user_id=request.user_id, company_id=request.company_id,
                                    role_type=RoleType.USER)
         await self.company_role_crud.create(company_role)
+        await self.invalidate_company_access(request.user_id, request.company_id)
 
     async def get_all_request_from_company_to_users(self, company_id: int) -> List[CompanyRequest]:
         # get all request from company to users with status PENDING
@@ -196,7 +219,7 @@ class CompanyService:
 
     async def get_all_users_in_company_by_company_id(self, company_id: int) -> List[CompanyMembership]:
         # find company
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
+        company = await self.company_crud.get_by_pk(company_id)
         if not company:
             raise HTTPException(status_code=404, detail="Not found company_id")
         # get all users in company
@@ -204,7 +227,7 @@ class CompanyService:
 
     async def check_user_in_company_membership(self, company_id: int, user_id: int) -> None:
         # find user
-        user = await self.user_crud.get_by_field(user_id, field_name='user_id')
+        user = await self.user_crud.get_by_pk(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="Not found user")
         # check user in CompanyMembership
@@ -222,13 +245,14 @@ class CompanyService:
             raise HTTPException(status_code=403, detail="Forbidden: Cannot deactivate the owner of the company")
 
         await self.membership_crud.update(user_membership, request_data.dict())
+        await self.invalidate_company_access(request_data.user_id, company_id)
 
     async def check_user_is_not_in_company_by_email(self, company_id: int, email: str) -> None:
         # Find auth_user by email
-        auth_user = await self.user_crud.get_by_field(email, field_name='email')
+        auth_user = await self.find_auth_user_by_email(email)
 
         # Find company
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
+        company = await self.company_crud.get_by_pk(company_id)
         if not company:
             raise HTTPException(status_code=404, detail="Not found company_id")
 
@@ -240,7 +264,7 @@ class CompanyService:
 
     async def check_user_request_existence(self, company_id: int, email: str) -> None:
         # find auth_user by email
-        auth_user = await self.user_crud.get_by_field(email, field_name='email')
+        auth_user = await self.find_auth_user_by_email(email)
 
         # check user has request by this company
         try:
@@ -253,10 +277,10 @@ class CompanyService:
 
     async def create_request_to_company_by_user(self, company_id: int, email: str) -> CompanyRequest:
         # find auth user
-        auth_user = await self.user_crud.get_by_field(email, field_name='email')
+        auth_user = await self.find_auth_user_by_email(email)
 
         # Check if company exists
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
+        company = await self.company_crud.get_by_pk(company_id)
         if not company:
             raise HTTPException(status_code=404, detail="Company not found")
 
@@ -268,10 +292,10 @@ class CompanyService:
 
     async def check_user_can_cancel_request(self, request_id: int, email: str) -> None:
         # Find auth_user by email
-        auth_user = await self.user_crud.get_by_field(email, field_name='email')
+        auth_user = await self.find_auth_user_by_email(email)
 
         # Find the request
-        company_request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        company_request = await self.company_request_crud.get_by_pk(request_id)
         if not company_request:
             raise HTTPException(status_code=404, detail="Request not found")
 
@@ -285,7 +309,7 @@ class CompanyService:
 
     async def cancel_user_request_to_company(self, request_id: int) -> CompanyRequest:
         # Find the request
-        company_request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        company_request = await self.company_request_crud.get_by_pk(request_id)
         if not company_request:
             raise HTTPException(status_code=404, detail="Request not found")
 
@@ -297,12 +321,12 @@ class CompanyService:
 
     async def check_that_user_created_request(self, request_id: int, email: str) -> None:
         # Find user
-        user = await self.user_crud.get_by_field(email, field_name='email')
+        user = await self.find_auth_user_by_email(email)
         if not user:
             raise HTTPException(status_code=404, detail="Not found user_id")
 
         # Find request
-        request = await self.company_request_crud.get_by_field(request_id, field_name='request_id')
+        request = await self.company_request_crud.get_by_pk(request_id)
         if not request:
             raise HTTPException(status_code=404, detail="Request not found")
 
@@ -314,7 +338,7 @@ class CompanyService:
 
     async def get_user_requests_by_email(self, email: str) -> List[CompanyRequest]:
         # Find user
-        user = await self.user_crud.get_by_field(email, field_name='email')
+        user = await self.find_auth_user_by_email(email)
         if not user:
             raise HTTPException(status_code=404, detail="Not found user_id")
 
@@ -323,7 +347,7 @@ class CompanyService:
 
     async def get_user_created_requests_by_email(self, email: str) -> List[CompanyRequest]:
         # find user
-        user = await self.user_crud.get_by_field(email, field_name='email')
+        user = await self.find_auth_user_by_email(email)
         if not user:
             raise HTTPException(status_code=404, detail="Not found user_id")
 
@@ -332,18 +356,17 @@ class CompanyService:
 
     async def check_user_in_company_by_email(self, company_id: int, email: str) -> None:
         # find user
-        user = await self.user_crud.get_by_field(email, field_name='email')
+        user = await self.find_auth_user_by_email(email)
         if not user:
             raise HTTPException(status_code=404, detail="Not found user")
 
-        # check user in CompanyMembership
-        company_member = await self.membership_crud.get_by_fields(company_id=company_id, user_id=user.user_id)
-        if not company_member:
+        # active membership, answered from the company access cache
+        if not await self.company_access.belongs_to_company(user.user_id, company_id):
             raise HTTPException(status_code=404, detail="Not found user in company")
 
     async def user_leave_from_company(self, company_id: int, email: str, request_data: UserLeaveCompanyRequest) -> None:
         # find user
-        user = await self.user_crud.get_by_field(email, field_name='email')
+        user = await self.find_auth_user_by_email(email)
         if not user:
             raise HTTPException(status_code=404, detail="Not found user")
         # find user in CompanyMembership table
@@ -355,24 +378,27 @@ class CompanyService:
 
         # Update user's is_active status
         await self.membership_crud.update(user_membership, request_data.dict())
+        await self.invalidate_company_access(user.user_id, company_id)
 
     async def change_user_role_in_company(self, company_id: int, request_data: UpdateCompanyRoleRequest) -> RoleType:
         # find role in company
         user_role = await self.company_role_crud.get_by_fields(company_id=company_id, user_id=request_data.user_id)
         # change user role
         change_role = await self.company_role_crud.update(user_role, request_data.dict())
+        await self.invalidate_company_access(request_data.user_id, company_id)
         return change_role
 
     async def get_all_members_in_company_by_role_type(self, company_id: int, role_type: RoleType) -> List[User]:
         # find company
-        company = await self.company_crud.get_by_field(company_id, field_name='company_id')
+        company = await self.company_crud.get_by_pk(company_id)
         if not company:
             raise HTTPException(status_code=404, detail="Not found company_id")
         # get all users in company by role type
         members = await self.company_role_crud.get_all(company_id=company.company_id, is_active=True,
                                                        role_type=role_type)
 
-        # get user details for each member
+        # get user details for all members in one query
+        users_by_id = await self.user_crud.get_many([member.user_id for member in members], field_name='user_id')
         users = [
             ShowUser(
                 user_id=user.user_id,
@@ -382,7 +408,7 @@ class CompanyService:
                 is_active=user.is_active
             )
             for member in members
-            if (user := await self.user_crud.get_by_field(member.user_id, field_name='user_id'))
+            if (user := users_by_id.get(member.user_id))
         ]
 
         return users
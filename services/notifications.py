@@ -1,4 +1,6 @@
-from typing import List
+from typing import List, Tuple, Optional
+
+import redis.asyncio as aioredis
 
 from fastapi import HTTPException
 from datetime import date
@@ -6,11 +8,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from db.models.models import (Answer, Company, User, CompanyMembership, CompanyRequest, CompanyRole, Quiz, QuizResult,
                               Question, UserAnswers, Notification)
 from managers.base_manager import CRUDBase
+from services.principal import Principal, PrincipalResolver
 
 class NotificationsService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, redis: aioredis.Redis):
         self.company_crud = CRUDBase[Company](Company, session)
         self.user_crud = CRUDBase[User](User, session)
+        self.principal_resolver = PrincipalResolver(session, redis)
         self.membership_crud = CRUDBase[CompanyMembership](CompanyMembership, session)
         self.company_request_crud = CRUDBase[CompanyRequest](CompanyRequest, session)
         self.company_role_crud = CRUDBase[CompanyRole](CompanyRole, session)
@@ -21,8 +25,8 @@ class NotificationsService:
         self.user_answer_crud = CRUDBase[UserAnswers](UserAnswers, session)
         self.notification_crud = CRUDBase[Notification](Notification, session)
 
-    async def find_auth_user_by_email(self, user_email: str) -> User:
-        return await self.user_crud.get_by_field(user_email, field_name='email')
+    async def find_auth_user_by_email(self, user_email: str) -> Optional[Principal]:
+        return await self.principal_resolver.resolve(user_email)
 
     async def find_user_notification_by_id(self, user_id: int, notification_id: int) -> Notification:
         return await self.notification_crud.get_by_fields(user_id=user_id, notification_id=notification_id)
@@ -32,6 +36,13 @@ class NotificationsService:
         notification_created = await self.notification_crud.create(notification)
         return notification_created
 
+    async def create_notifications(self, user_ids: List[int], text: str, commit: bool = True) -> List[Notification]:
+        values = [{"user_id": user_id, "text": text} for user_id in user_ids]
+        return await self.notification_crud.bulk_insert(values, commit=commit)
+
+    async def save_notifications(self, notifications: List[Notification]) -> List[Notification]:
+        return await self.notification_crud.create_many(notifications)
+
     async def user_get_active_notifications_by_email(self, email: str) -> List[Notification]:
         auth_user = await self.find_auth_user_by_email(email)
         notifications = await self.notification_crud.get_all(user_id=auth_user.user_id, status=True)
@@ -39,6 +50,15 @@ class NotificationsService:
             raise HTTPException(status_code=404, detail="No notifications found")
         return notifications
 
+    async def user_get_notifications_by_cursor(self, email: str, cursor: Optional[str],
+                                               size: int) -> Tuple[List[Notification], Optional[str]]:
+        auth_user = await self.find_auth_user_by_email(email)
+        try:
+            return await self.notification_crud.get_cursor_page(cursor, size, order_by=['timestamp'], descending=True,
+                                                                user_id=auth_user.user_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
     async def user_mark_notification_as_read(self, email: str, notification_id: int) -> Notification:
         auth_user = await self.find_auth_user_by_email(email)
 
@@ -0,0 +1,103 @@
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from db.models.models import User
+from db.session import is_replica_session
+from logger import logger
+from managers.base_manager import CRUDBase
+from utils import serialization
+from utils.cache import TTLCache, cache_key, cache_requests, cache_errors
+
+PRINCIPAL_FIELDS = ['user_id', 'name', 'surname', 'email', 'is_active']
+# per-request tier: every service of one request shares the session, so they share this dict too
+REQUEST_PRINCIPALS_KEY = "principals"
+
+local_principals = TTLCache(maxsize=settings.PRINCIPAL_LOCAL_CACHE_SIZE, ttl=settings.PRINCIPAL_LOCAL_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, only the fields that do not change between requests on their own."""
+    user_id: int
+    name: str
+    surname: str
+    email: str
+    is_active: bool
+
+
+def principal_cache_key(email: str) -> str:
+    return cache_key("principal", email)
+
+
+class PrincipalResolver:
+    """Resolves a token email to a Principal: request scope, then the process LRU, then Redis, then the database.
+
+    A replica may still have the row from before a deactivation, so on a replica session the shared caches
+    are read, never filled.
+    """
+
+    def __init__(self, session: AsyncSession, redis: aioredis.Redis):
+        self.session = session
+        self.user_crud = CRUDBase[User](User, session)
+        self.redis = redis
+        self.fills_cache = not is_replica_session(session)
+
+    @property
+    def _request_principals(self) -> dict:
+        return self.session.info.setdefault(REQUEST_PRINCIPALS_KEY, {})
+
+    async def resolve(self, email: str) -> Optional[Principal]:
+        if email in self._request_principals:
+            return self._request_principals[email]
+
+        principal = local_principals.get(email)
+        if principal is not None:
+            cache_requests.labels("principal", "local_hit").inc()
+        else:
+            principal = await self._resolve_shared(email)
+            if principal is not None and self.fills_cache:
+                local_principals.set(email, principal)
+
+        self._request_principals[email] = principal
+        return principal
+
+    async def _resolve_shared(self, email: str) -> Optional[Principal]:
+        try:
+            cached = await self.redis.get(principal_cache_key(email))
+        except RedisError as exc:
+            cache_errors.labels("principal").inc()
+            logger.warning(f"principal cache unavailable: {exc}")
+            cached = None
+        if cached is not None:
+            cache_requests.labels("principal", "hit").inc()
+            return Principal(*serialization.loads(cached))
+
+        cache_requests.labels("principal", "miss").inc()
+        rows = await self.user_crud.get_columns(PRINCIPAL_FIELDS, email=email)
+        if not rows:
+            return None
+        principal = Principal(*rows[0])
+        if not self.fills_cache:
+            return principal
+        try:
+            await self.redis.set(principal_cache_key(email), serialization.dumps(list(asdict(principal).values())),
+                                 ex=settings.PRINCIPAL_CACHE_TTL)
+        except RedisError as exc:
+            cache_errors.labels("principal").inc()
+            logger.warning(f"principal cache unavailable: {exc}")
+        return principal
+
+    async def invalidate(self, email: str) -> None:
+        """Call after the user row changed. Other workers drop their copy after PRINCIPAL_LOCAL_CACHE_TTL."""
+        self._request_principals.pop(email, None)
+        local_principals.pop(email)
+        try:
+            await self.redis.delete(principal_cache_key(email))
+        except RedisError as exc:
+            cache_errors.labels("principal").inc()
+            logger.warning(f"principal cache unavailable: {exc}")
@@ -0,0 +1,118 @@
+from collections import namedtuple
+from dataclasses import dataclass
+from functools import partial
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, Optional, Tuple
+
+import redis.asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from db.models.models import Answer, Question, Quiz
+from db.session import is_replica_session
+from managers.base_manager import CRUDBase
+from utils.cache import TTLCache, VersionedCache, cache_requests
+
+QUIZ_SNAPSHOT_QUIZ_FIELDS = ['quiz_id', 'company_id', 'author_id', 'name', 'description', 'frequency_in_days',
+                             'is_active']
+QUIZ_SNAPSHOT_QUESTION_FIELDS = ['question_id', 'quiz_id', 'question_text', 'is_active']
+QUIZ_SNAPSHOT_ANSWER_FIELDS = ['answer_id', 'quiz_id', 'question_id', 'answer_text', 'is_correct']
+
+SnapshotQuiz = namedtuple("SnapshotQuiz", QUIZ_SNAPSHOT_QUIZ_FIELDS)
+SnapshotQuestion = namedtuple("SnapshotQuestion", QUIZ_SNAPSHOT_QUESTION_FIELDS)
+SnapshotAnswer = namedtuple("SnapshotAnswer", QUIZ_SNAPSHOT_ANSWER_FIELDS)
+
+local_quiz_snapshots = TTLCache(maxsize=settings.QUIZ_SNAPSHOT_LOCAL_CACHE_SIZE,
+                                ttl=settings.QUIZ_SNAPSHOT_LOCAL_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class QuizSnapshot:
+    """One version of a quiz definition: the quiz, its active questions and their answers."""
+    quiz: SnapshotQuiz
+    questions: Tuple[SnapshotQuestion, ...]
+    answers: Mapping[int, Tuple[SnapshotAnswer, ...]]
+    correct_answers: Mapping[int, FrozenSet[int]]
+
+    @classmethod
+    def build(cls, quiz: SnapshotQuiz, questions, answers) -> "QuizSnapshot":
+        questions = tuple(sorted(questions, key=lambda question: question.question_id))
+        answers_by_question = {question.question_id: [] for question in questions}
+        for answer in sorted(answers, key=lambda answer: answer.answer_id):
+            # answers of inactive questions are not part of the quiz
+            if answer.question_id in answers_by_question:
+                answers_by_question[answer.question_id].append(answer)
+        return cls(
+            quiz=quiz,
+            questions=questions,
+            answers=MappingProxyType({question_id: tuple(question_answers)
+                                      for question_id, question_answers in answers_by_question.items()}),
+            correct_answers=MappingProxyType({
+                question_id: frozenset(answer.answer_id for answer in question_answers if answer.is_correct)
+                for question_id, question_answers in answers_by_question.items()}),
+        )
+
+    @property
+    def question_ids(self) -> FrozenSet[int]:
+        return frozenset(self.answers)
+
+    def has_answer(self, question_id: int, answer_id: int) -> bool:
+        return any(answer.answer_id == answer_id for answer in self.answers.get(question_id, ()))
+
+
+class QuizSnapshotCache(VersionedCache):
+    """Quiz snapshots by quiz_id, in the process LRU and in Redis.
+
+    Every edit of the quiz, of one of its questions or answers calls invalidate(), which bumps the quiz's
+    version; other workers keep serving their local copy for up to QUIZ_SNAPSHOT_LOCAL_CACHE_TTL seconds.
+    """
+
+    name = "quiz_snapshot"
+
+    def __init__(self, session: AsyncSession, redis: aioredis.Redis):
+        super().__init__(redis, ttl=settings.QUIZ_SNAPSHOT_CACHE_TTL, fills_cache=not is_replica_session(session))
+        self.quizzes_crud = CRUDBase[Quiz](Quiz, session)
+        self.question_crud = CRUDBase[Question](Question, session)
+        self.answers_crud = CRUDBase[Answer](Answer, session)
+
+    def dumps(self, snapshot: Optional[QuizSnapshot]) -> Optional[list]:
+        if snapshot is None:
+            return None
+        return [list(snapshot.quiz), [list(question) for question in snapshot.questions],
+                [list(answer) for question_answers in snapshot.answers.values() for answer in question_answers]]
+
+    def loads(self, value: Optional[list]) -> Optional[QuizSnapshot]:
+        if value is None:
+            return None
+        quiz, questions, answers = value
+        return QuizSnapshot.build(SnapshotQuiz(*quiz), [SnapshotQuestion(*question) for question in questions],
+                                  [SnapshotAnswer(*answer) for answer in answers])
+
+    async def _load(self, quiz_id: int) -> Optional[QuizSnapshot]:
+        quizzes = await self.quizzes_crud.get_columns(QUIZ_SNAPSHOT_QUIZ_FIELDS, quiz_id=quiz_id)
+        if not quizzes:
+            return None
+        questions = await self.question_crud.get_columns(QUIZ_SNAPSHOT_QUESTION_FIELDS, quiz_id=quiz_id,
+                                                         is_active=True)
+        # by question, answers.quiz_id has no index
+        answers = await self.answers_crud.get_columns_in(QUIZ_SNAPSHOT_ANSWER_FIELDS,
+                                                         [question.question_id for question in questions],
+                                                         field_name='question_id')
+        return QuizSnapshot.build(SnapshotQuiz(*quizzes[0]), [SnapshotQuestion(*question) for question in questions],
+                                  [SnapshotAnswer(*answer) for answer in answers])
+
+    async def get(self, quiz_id: int) -> Optional[QuizSnapshot]:
+        """Return None when the quiz does not exist."""
+        snapshot = local_quiz_snapshots.get(quiz_id)
+        if snapshot is not None:
+            cache_requests.labels(self.name, "local_hit").inc()
+            return snapshot
+
+        snapshot = await self.get_or_load(quiz_id, partial(self._load, quiz_id))
+        if snapshot is not None and self.fills_cache:
+            local_quiz_snapshots.set(quiz_id, snapshot)
+        return snapshot
+
+    async def invalidate(self, quiz_id: int) -> None:
+        local_quiz_snapshots.pop(quiz_id)
+        await super().invalidate(quiz_id)
@@ -1,25 +1,38 @@
-from typing import Union, List
+from typing import List, Tuple, Optional, AsyncIterator
 
 from fastapi import HTTPException
-import json
+import csv
+import io
 from datetime import datetime, timedelta
-import asyncio_redis
-import config
-import pandas as pd
+from functools import partial
+import redis.asyncio as aioredis
+from sqlalchemy import select, literal, DateTime
 from sqlalchemy.ext.asyncio import AsyncSession
 from db.models.models import (Answer, Company, User, CompanyMembership, CompanyRequest, CompanyRole, Quiz, QuizResult,
-                              Question, UserAnswers)
+                              Question, UserAnswers, Notification, UserScore, UserQuizScore)
 from schemas.quizzes import QuizCreate, QuizUpdate, UserAnswersCreate, QuizResultCreate
 from schemas.questions import QuestionUpdate
 from schemas.answers import AnswerUpdate
 from managers.base_manager import CRUDBase
+from services.principal import Principal, PrincipalResolver
+from db.unit_of_work import UnitOfWork, after_commit
 from services.notifications import NotificationsService
+from services.authorization import CompanyAccessResolver
+from services.quiz_snapshot import QuizSnapshot, QuizSnapshotCache, SnapshotQuiz
+from utils.cache import QuizResultsCache
+from utils.columnar import quiz_results_to_table, write_parquet, write_arrow_ipc
+
+CSV_EXPORT_FIELDS = ['user_id', 'quiz_id', 'question_id', 'user_answer_id', 'result', 'company_id']
+CSV_EXPORT_CHUNK_ROWS = 1000
 
 
 class QuizService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, redis: aioredis.Redis):
+        self.session = session
+        self.redis = redis
         self.company_crud = CRUDBase[Company](Company, session)
         self.user_crud = CRUDBase[User](User, session)
+        self.principal_resolver = PrincipalResolver(session, redis)
         self.membership_crud = CRUDBase[CompanyMembership](CompanyMembership, session)
         self.company_request_crud = CRUDBase[CompanyRequest](CompanyRequest, session)
         self.company_role_crud = CRUDBase[CompanyRole](CompanyRole, session)
@@ -28,23 +41,43 @@ class QuizService:
         self.question_crud = CRUDBase[Question](Question, session)
         self.answers_crud = CRUDBase[Answer](Answer, session)
         self.user_answer_crud = CRUDBase[UserAnswers](UserAnswers, session)
-        self.notifications_service = NotificationsService(session)
+        self.user_score_crud = CRUDBase[UserScore](UserScore, session)
+        self.user_quiz_score_crud = CRUDBase[UserQuizScore](UserQuizScore, session)
+        self.notifications_service = NotificationsService(session, redis)
+        self.quiz_results_cache = QuizResultsCache(redis, self.quiz_result_crud)
+        self.unit_of_work = UnitOfWork(session)
+        self.company_access = CompanyAccessResolver(session, redis)
+        self.quiz_snapshots = QuizSnapshotCache(session, redis)
 
-    async def find_auth_user_by_email(self, user_email: str) -> User:
-        return await self.user_crud.get_by_field(user_email, field_name='email')
+    async def find_auth_user_by_email(self, user_email: str) -> Optional[Principal]:
+        return await self.principal_resolver.resolve(user_email)
 
     async def find_user_by_user_id(self, user_id: int) -> User:
-        return await self.user_crud.get_by_field(user_id, field_name='user_id')
+        return await self.user_crud.get_by_pk(user_id)
 
     async def find_company_by_id(self, company_id: int) -> User:
-        return await self.company_crud.get_by_field(company_id, field_name='company_id')
+        return await self.company_crud.get_by_pk(company_id)
 
     async def get_quiz_by_quiz_id(self, quiz_id: int) -> Quiz:
-        return await self.quizzes_crud.get_by_field(quiz_id, field_name='quiz_id')
+        return await self.quizzes_crud.get_by_pk(quiz_id)
+
+    async def get_quiz_snapshot(self, quiz_id: int) -> Optional[QuizSnapshot]:
+        return await self.quiz_snapshots.get(quiz_id)
+
+    async def get_quiz(self, quiz_id: int) -> Optional[SnapshotQuiz]:
+        snapshot = await self.get_quiz_snapshot(quiz_id)
+        return snapshot.quiz if snapshot else None
+
+    async def invalidate_quiz_snapshot(self, quiz_id: int) -> None:
+        # dropped only after the edit is committed
+        await after_commit(self.session, partial(self.quiz_snapshots.invalidate, quiz_id))
 
     async def get_all_quizzes(self) -> List[Quiz]:
         return await self.quizzes_crud.get_all()
 
+    async def get_company_quizzes_page(self, company_id: int, offset: int, limit: int) -> Tuple[List[Quiz], int]:
+        return await self.quizzes_crud.get_page(offset, limit, company_id=company_id, is_active=True)
+
     async def get_all_company_quizzes(self, company_id: int) -> List[Quiz]:
         return await self.quizzes_crud.get_all(company_id=company_id, is_active=True)
 
@@ -60,19 +93,47 @@ class QuizService:
     async def get_all_answer(self, question_id: int) -> List[Answer]:
         return await self.answers_crud.get_all(question_id=question_id)
 
+    async def get_questions_page(self, quiz_id: int, offset: int, limit: int) -> Tuple[List[Question], int]:
+        return await self.question_crud.get_page(offset, limit, quiz_id=quiz_id)
+
+    async def get_answers_page(self, question_id: int, offset: int, limit: int) -> Tuple[List[Answer], int]:
+        return await self.answers_crud.get_page(offset, limit, question_id=question_id)
+
     async def get_all_user_answers(self, user_id: int, quiz_id: int) -> List[UserAnswers]:
         return await self.user_answer_crud.get_all(user_id=user_id, quiz_id=quiz_id)
 
+    async def get_user_quiz_results_by_cursor(self, user_email: str, cursor: Optional[str],
+                                              size: int) -> Tuple[List[QuizResult], Optional[str]]:
+        auth_user = await self.find_auth_user_by_email(user_email)
+        try:
+            return await self.quiz_result_crud.get_cursor_page(cursor, size, order_by=['timestamp'], descending=True,
+                                                               user_id=auth_user.user_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    async def get_user_answers_by_cursor(self, user_email: str, cursor: Optional[str],
+                                         size: int) -> Tuple[List[UserAnswers], Optional[str]]:
+        auth_user = await self.find_auth_user_by_email(user_email)
+        try:
+            return await self.user_answer_crud.get_cursor_page(cursor, size, order_by=['timestamp'], descending=True,
+                                                               user_id=auth_user.user_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
     async def get_question_by_question_id(self, question_id: int) -> Quiz:
-        return await self.question_crud.get_by_field(question_id, field_name='question_id')
+        return await self.question_crud.get_by_pk(question_id)
 
     async def get_answer_by_answer_id(self, answer_id: int) -> Quiz:
-        return await self.answers_crud.get_by_field(answer_id, field_name='answer_id')
+        return await self.answers_crud.get_by_pk(answer_id)
 
     async def get_quiz_result_by_id(self, result_id: int) -> Quiz:
-        return await self.quiz_result_crud.get_by_field(result_id, field_name='result_id')
+        return await self.quiz_result_crud.get_by_pk(result_id)
 
     async def create_quiz(self, user_email: str, quiz_data: QuizCreate) -> Quiz:
+        # quiz, questions, answers and member notifications are written in one transaction
+        return await self.unit_of_work.run(self._create_quiz, user_email, quiz_data)
+
+    async def _create_quiz(self, user_email: str, quiz_data: QuizCreate) -> Quiz:
         auth_user = await self.find_auth_user_by_email(user_email)
 
         # We check whether a company with the specified company_id exists
@@ -84,6 +145,11 @@ class QuizService:
         if len(quiz_data.questions) < 2:
             raise HTTPException(status_code=400, detail="Quiz must have at least two questions")
 
+        # Check if each question has at least two answers before anything is written
+        for question_data in quiz_data.questions:
+            if len(question_data.answers) < 2:
+                raise HTTPException(status_code=400, detail="Each question must have at least two answer options")
+
         created_quiz = Quiz(
             company_id=company.company_id,
             author_id=auth_user.user_id,
@@ -92,36 +158,40 @@ class QuizService:
             frequency_in_days=quiz_data.frequency_in_days
         )
 
-        # Insert the Quiz object to the database to generate the quiz_id
-        await self.quizzes_crud.create(created_quiz)
+        # Flush the Quiz object to generate the quiz_id
+        await self.quizzes_crud.create(created_quiz, commit=False)
 
-        for question_data in quiz_data.questions:
-            # Check if each question has at least two answers
-            if len(question_data.answers) < 2:
-                raise HTTPException(status_code=400, detail="Each question must have at least two answer options")
-
-            question = Question(
+        questions = [
+            Question(
                 quiz_id=created_quiz.quiz_id,
                 question_text=question_data.question_text,
                 is_active=question_data.is_active
             )
+            for question_data in quiz_data.questions
+        ]
 
-            # Insert the Question object to the database to generate the question_id
-            await self.question_crud.create(question)
-
-            for answer_data in question_data.answers:
-                answer = Answer(
-                    quiz_id=created_quiz.quiz_id,
-                    question_id=question.question_id,
-                    answer_text=answer_data.answer_text,
-                    is_correct=answer_data.is_correct
-                )
-                await self.answers_crud.create(answer)
+        # Insert all questions in one batch to generate the question_ids
+        await self.question_crud.create_many(questions, commit=False)
 
+        answers = [
+            Answer(
+                quiz_id=created_quiz.quiz_id,
+                question_id=question.question_id,
+                answer_text=answer_data.answer_text,
+                is_correct=answer_data.is_correct
+            )
+            for question, question_data in zip(questions, quiz_data.questions)
+            for answer_data in question_data.answers
+        ]
+        await self.answers_crud.create_many(answers, commit=False)
+        # a lookup of this id before the quiz existed may have cached "no quiz"
+        await self.invalidate_quiz_snapshot(created_quiz.quiz_id)
+
+        # Notifying members commits the whole quiz together with the notifications
         company_members = await self.find_all_company_members_by_company_id(company.company_id)
-        for member in company_members:
-            notification_text = f"New quiz '{created_quiz.quiz_id}' is available! Take the quiz now!"
-            await self.notifications_service.create_notification(user_id=member.user_id, text=notification_text)
+        notification_text = f"New quiz '{created_quiz.quiz_id}' is available! Take the quiz now!"
+        await self.notifications_service.create_notifications(
+            user_ids=[member.user_id for member in company_members], text=notification_text)
 
         return created_quiz
 
@@ -131,6 +201,8 @@ class QuizService:
             raise HTTPException(status_code=404, detail="No quiz found")
 
         updated_quiz = await self.quizzes_crud.update(quiz, quiz_data.dict())
+        await self.invalidate_quiz_snapshot(quiz_id)
+        await self.quiz_results_cache.invalidate_all()
         return updated_quiz
 
     async def delete_quiz(self, quiz_id: int) -> Quiz:
@@ -140,6 +212,8 @@ class QuizService:
 
         update_data = {'is_active': False}
         deleted_quiz = await self.quizzes_crud.update(quiz, update_data)
+        await self.invalidate_quiz_snapshot(quiz_id)
+        await self.quiz_results_cache.invalidate_all()
         return deleted_quiz
 
     async def update_question(self, question_id: int, question_data: QuestionUpdate) -> Quiz:
@@ -148,6 +222,8 @@ class QuizService:
             raise HTTPException(status_code=404, detail="No question found")
 
         updated_question = await self.quizzes_crud.update(question, question_data.dict())
+        await self.invalidate_quiz_snapshot(updated_question.quiz_id)
+        await self.quiz_results_cache.invalidate_all()
         return updated_question
 
     async def update_answer(self, answer_id: int, answer_data: AnswerUpdate) -> Quiz:
@@ -156,6 +232,8 @@ class QuizService:
             raise HTTPException(status_code=404, detail="No answer found")
 
         updated_answer = await self.quizzes_crud.update(answer, answer_data.dict())
+        await self.invalidate_quiz_snapshot(updated_answer.quiz_id)
+        await self.quiz_results_cache.invalidate_all()
         return updated_answer
 
     async def create_user_answer(self, user_email: str, user_answer_data: UserAnswersCreate) -> UserAnswers:
@@ -163,20 +241,25 @@ class QuizService:
         if not auth_user:
             raise HTTPException(status_code=404, detail="No user found")
 
-        quiz = await self.get_quiz_by_quiz_id(user_answer_data.quiz_id)
-
-        questions = await self.get_all_questions(user_answer_data.quiz_id)
-        if not questions:
+        # the quiz, its active questions and their answers come from the cached snapshot
+        snapshot = await self.get_quiz_snapshot(user_answer_data.quiz_id)
+        if not snapshot or not snapshot.questions:
             raise HTTPException(status_code=404, detail="No quiz found")
+        quiz = snapshot.quiz
+
+        if user_answer_data.question_id not in snapshot.answers:
+            raise HTTPException(status_code=404, detail="No question found")
+        if not snapshot.has_answer(user_answer_data.question_id, user_answer_data.answer_id):
+            raise HTTPException(status_code=404, detail="No answer found")
 
         all_user_answers = await self.user_answer_crud.get_all(user_id=auth_user.user_id)
 
-        user_answers = [answer for answer in all_user_answers if
-                        answer.question_id in [q.question_id for q in questions]]
+        question_ids = snapshot.question_ids
+        user_answers = [answer for answer in all_user_answers if answer.question_id in question_ids]
 
         if any(answer.question_id == user_answer_data.question_id for answer in user_answers):
 
-            if len(user_answers) == len(questions):
+            if len(user_answers) == len(snapshot.questions):
 
                 last_answer = max(user_answers, key=lambda x: x.timestamp)
 
@@ -197,126 +280,126 @@ class QuizService:
         return created_user_answer
 
     async def create_quiz_result(self, quiz_result_data: QuizResultCreate) -> List[QuizResult]:
-        user = await self.find_user_by_user_id(quiz_result_data.user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="No user found")
-
-        quiz_results = []
-
-        questions = await self.user_answer_crud.get_all(user_id=user.user_id)
-
-        for question in questions:
-            answers = await self.user_answer_crud.get_all(question_id=question.question_id)
-
-            for answer in answers:
-                quiz_data = await self.quizzes_crud.get_by_field(answer.quiz_id, field_name='quiz_id')
-
-                question_data = await self.question_crud.get_by_field(question.question_id,
-                                                                      field_name='question_id')
-
-                answer_data = await self.answers_crud.get_by_field(answer.answer_id, field_name='answer_id')
-
-                result = answer_data.is_correct
-
-                quiz_result = QuizResult(
-                    user_id=user.user_id,
-                    quiz_id=quiz_data.quiz_id,
-                    question_id=question_data.question_id,
-                    user_answer_id=answer.user_answer_id,
-                    result=result
-                )
-                quiz_results.append(quiz_result)
-        for quiz_result in quiz_results:
-            await self.quiz_result_crud.create(quiz_result)
-        await self.calculate_and_update_average_score(user.user_id)
-        await self.save_data_to_redis(user.user_id)
+        # results and the new average score are written in one transaction
+        quiz_results = await self.unit_of_work.run(self._create_quiz_result, quiz_result_data)
+        # write-through, so the export and the analytics keep reading from the cache
+        await self.quiz_results_cache.refresh(quiz_result_data.user_id)
         return quiz_results
 
-    async def calculate_and_update_average_score(self, user_id: int) -> int:
-        quiz_results = await self.quiz_result_crud.get_all(user_id=user_id)
-
-        true_count = sum(1 for quiz_result in quiz_results if quiz_result.result)
-
-        user = await self.find_user_by_user_id(user_id)
+    async def _create_quiz_result(self, quiz_result_data: QuizResultCreate) -> List[QuizResult]:
+        user = await self.find_user_by_user_id(quiz_result_data.user_id)
         if not user:
             raise HTTPException(status_code=404, detail="No user found")
 
-        user_data = {"average_score": true_count}
-        await self.user_crud.update(user, user_data)
-
-        return true_count
-
-    async def save_data_to_redis(self, user_id: int):
-        redis_connection = await self.create_redis_connection()
+        # grade every not yet graded answer of the attempt in a single INSERT ... SELECT
+        already_graded = select(QuizResult.result_id).filter(
+            QuizResult.user_answer_id == UserAnswers.user_answer_id).exists()
+        ungraded_answers = (
+            select(UserAnswers.user_id, UserAnswers.quiz_id, UserAnswers.question_id, UserAnswers.user_answer_id,
+                   Answer.is_correct, literal(datetime.utcnow(), DateTime))
+            .join(Answer, Answer.answer_id == UserAnswers.answer_id)
+            .filter(UserAnswers.user_id == user.user_id, ~already_graded)
+        )
+        if quiz_result_data.quiz_id is not None:
+            ungraded_answers = ungraded_answers.filter(UserAnswers.quiz_id == quiz_result_data.quiz_id)
+
+        # NOT EXISTS skips what is already committed; a concurrent grading of the same answers waits on the
+        # unique index instead and inserts nothing for them
+        quiz_results = await self.quiz_result_crud.insert_from_select(
+            ['user_id', 'quiz_id', 'question_id', 'user_answer_id', 'result', 'timestamp'], ungraded_answers,
+            conflict_fields=['user_answer_id'])
+        await self.update_scores(user.user_id, quiz_results)
+        return quiz_results
 
-        user = await self.find_user_by_user_id(user_id)
-        company = await self.membership_crud.get_by_field(user.user_id, field_name='user_id')
-        quiz_results = await self.quiz_result_crud.get_all(user_id=user.user_id)
+    async def update_scores(self, user_id: int, quiz_results: List[QuizResult]) -> None:
+        # add only the newly graded results to the running totals, the user's history is never re-read;
+        # quiz_results are the rows RETURNING gave back, so an answer graded concurrently is never counted twice
+        if not quiz_results:
+            return
 
-        quiz_results_with_company = []
+        quiz_counts = {}
         for quiz_result in quiz_results:
-            quiz_result_with_company = {
-                'user_id': quiz_result.user_id,
-                'quiz_id': quiz_result.quiz_id,
-                'question_id': quiz_result.question_id,
-                'user_answer_id': quiz_result.user_answer_id,
-                'result': quiz_result.result,
-                'company_id': company.company_id
-            }
-            quiz_results_with_company.append(quiz_result_with_company)
-
-        quiz_results_json = json.dumps(quiz_results_with_company)
-        await redis_connection.setex(str(user.user_id), 172800, quiz_results_json)
-        redis_connection.close()
-
-    async def create_redis_connection(self):
-        redis_host = config.settings.REDIS_HOST
-        redis_port = config.settings.REDIS_PORT
-
-        redis_connection = await asyncio_redis.Connection.create(host=redis_host, port=redis_port)
-        return redis_connection
-
-    async def export_json_data_by_user_id(self, user_id: int):
-        redis_connection = await self.create_redis_connection()
-
-        data = await redis_connection.get(str(user_id))
-        if not data:
-            data_list = await self.quiz_result_crud.get_all(user_id=user_id)
-
-            data_dict = {index: item for index, item in enumerate(data_list)}
-            return data_dict
-
-        data_dict = json.loads(data)
-        return data_dict
-
-    async def export_csv_data_by_user_id(self, user_id: int) -> Union[pd.DataFrame, dict]:
-        redis_connection = await self.create_redis_connection()
-        data = await redis_connection.get(str(user_id))
-        if not data:
-            data_list = await self.quiz_result_crud.get_all(user_id=user_id)
-            data_dict = {index: item for index, item in enumerate(data_list)}
-            return data_dict
-        else:
-            data_list = json.loads(data)
-            data_frame = pd.DataFrame(data_list)
-            return data_frame
+            correct_count, total_count = quiz_counts.get(quiz_result.quiz_id, (0, 0))
+            quiz_counts[quiz_result.quiz_id] = (correct_count + bool(quiz_result.result), total_count + 1)
+
+        await self.user_quiz_score_crud.upsert_increment(
+            [{"user_id": user_id, "quiz_id": quiz_id, "correct_count": correct_count, "total_count": total_count}
+             for quiz_id, (correct_count, total_count) in quiz_counts.items()],
+            index_fields=['user_id', 'quiz_id'], increment_fields=['correct_count', 'total_count'])
+
+        correct_count = sum(correct for correct, _ in quiz_counts.values())
+        await self.user_score_crud.upsert_increment(
+            [{"user_id": user_id, "correct_count": correct_count, "total_count": len(quiz_results)}],
+            index_fields=['user_id'], increment_fields=['correct_count', 'total_count'])
+
+        # average_score keeps counting correct answers, as before
+        await self.user_crud.increment(user_id, average_score=correct_count)
+
+    async def _export_company_id(self, user_id: int) -> Optional[int]:
+        memberships = await self.membership_crud.get_columns(['company_id'], user_id=user_id)
+        return memberships[0].company_id if memberships else None
+
+    async def _iter_export_rows(self, user_id: int) -> AsyncIterator[list]:
+        # walk the results on a server-side cursor, a very long history never sits in memory at once
+        company_id = await self._export_company_id(user_id)
+        async for row in self.quiz_result_crud.stream_columns(CSV_EXPORT_FIELDS[:-1], order_by=['result_id'],
+                                                              user_id=user_id):
+            yield [*row, company_id]
+
+    async def export_json_data_by_user_id(self, user_id: int) -> List[dict]:
+        # the same cached results the analytics read, the database is only queried on a miss
+        company_id = await self._export_company_id(user_id)
+        results = await self.quiz_results_cache.get(user_id)
+        return [{**{field_name: getattr(result, field_name) for field_name in CSV_EXPORT_FIELDS[:-1]},
+                 "company_id": company_id} for result in results]
+
+    async def export_csv_data_by_user_id(self, user_id: int) -> AsyncIterator[str]:
+        """Yield the user's results as CSV text, CSV_EXPORT_CHUNK_ROWS rows per chunk."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_EXPORT_FIELDS)
+        rows_in_buffer = 0
+        async for row in self._iter_export_rows(user_id):
+            writer.writerow(row)
+            rows_in_buffer += 1
+            if rows_in_buffer >= CSV_EXPORT_CHUNK_ROWS:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                rows_in_buffer = 0
+        yield buffer.getvalue()
+
+    async def _export_table(self, user_id: int):
+        rows = [row async for row in self._iter_export_rows(user_id)]
+        return quiz_results_to_table(rows, CSV_EXPORT_FIELDS)
+
+    async def export_parquet_data_by_user_id(self, user_id: int) -> bytes:
+        return write_parquet(await self._export_table(user_id))
+
+    async def export_arrow_data_by_user_id(self, user_id: int) -> bytes:
+        return write_arrow_ipc(await self._export_table(user_id))
 
     async def verification_of_belonging_to_one_company(self, user_email: str, user_id: int):
         auth_user = await self.find_auth_user_by_email(user_email)
+        if not auth_user:
+            raise HTTPException(status_code=403, detail="Forbidden download file")
+
+        # any active company in common counts, not only the first membership of each user
+        if auth_user.user_id == user_id or await self.company_access.shares_active_company(auth_user.user_id,
+                                                                                            user_id):
+            return
 
+        # only the failure path needs to tell a missing user from a foreign one
         user = await self.find_user_by_user_id(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="No user found")
-
-        company_user = await self.membership_crud.get_by_field(user_id, field_name='user_id')
-        company_auth_user = await self.membership_crud.get_by_field(auth_user.user_id, field_name='user_id')
-        if company_user.company_id != company_auth_user.company_id:
-            raise HTTPException(status_code=403, detail="Forbidden download file")
+        raise HTTPException(status_code=403, detail="Forbidden download file")
 
     async def create_notifications(self):
         current_date = datetime.now()
 
         all_users = await self.find_all_company_members()
+        notifications = []
 
         for user in all_users:
             user_id = user.user_id
@@ -334,11 +417,11 @@ class QuizService:
 
                 if not check_user_answers:
                     notification_text = f"Quiz {quiz.name} is available! Take the test right now!"
-                    await self.notifications_service.create_notification(user_id=user_id, text=notification_text)
+                    notifications.append(Notification(user_id=user_id, text=notification_text))
 
                 if len(check_user_answers) < len(questions):
                     notification_text = f"Complete the quiz {quiz.name}"
-                    await self.notifications_service.create_notification(user_id=user_id, text=notification_text)
+                    notifications.append(Notification(user_id=user_id, text=notification_text))
 
                 if len(check_user_answers) == len(questions):
                     last_user_answer = None
@@ -352,6 +435,8 @@ class QuizService:
                     if last_user_answer is not None and current_date - last_user_answer.timestamp >= timedelta(
                             days=frequency):
                         notification_text = f"The frequency in days {frequency} has already passed. Take the {quiz.name} test now!"
-                        await self.notifications_service.create_notification(user_id=user_id, text=notification_text)
+                        notifications.append(Notification(user_id=user_id, text=notification_text))
                     else:
                         continue
+
+        await self.notifications_service.save_notifications(notifications)
@@ -1,46 +1,64 @@
 from fastapi import HTTPException
-from typing import List
+from typing import List, Tuple, Optional
+
+import redis.asyncio as aioredis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.models.models import User
 from utils.hashing import Hasher
 from managers.base_manager import CRUDBase
+from services.principal import Principal, PrincipalResolver
 from schemas.users import UserCreate, UpdateUserRequest, DeactivateUserRequest
 
 
 class UsersService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, redis: aioredis.Redis):
         self.user_crud = CRUDBase[User](User, session)
+        self.principal_resolver = PrincipalResolver(session, redis)
+
+    async def find_auth_user_by_email(self, email: str) -> Optional[Principal]:
+        return await self.principal_resolver.resolve(email)
 
     async def get_all_users(self) -> List[User]:
         return await self.user_crud.get_all()
 
+    async def get_users_page(self, offset: int, limit: int) -> Tuple[List[User], int]:
+        return await self.user_crud.get_page(offset, limit)
+
+    async def get_users_by_cursor(self, cursor: Optional[str], size: int) -> Tuple[List[User], Optional[str]]:
+        try:
+            return await self.user_crud.get_cursor_page(cursor, size)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
     async def get_user_by_id(self, user_id: int) -> User:
-        user = await self.user_crud.get_by_field(user_id, field_name='user_id')
+        user = await self.user_crud.get_by_pk(user_id)
         return user
 
     async def create_user(self, user_data: UserCreate) -> User:
-        hashed_password = Hasher.get_password_hash(user_data.password)
+        hashed_password = await Hasher.get_password_hash_async(user_data.password)
         user = User(name=user_data.name, surname=user_data.surname, email=user_data.email,
                     hashed_password=hashed_password)
         created_user = await self.user_crud.create(user)
         return created_user
 
     async def update_user(self, user_id: int, user_data: UpdateUserRequest, email: str) -> User:
-        current_user = await self.user_crud.get_by_field(email, field_name='email')
-        user = await self.user_crud.get_by_field(user_id, field_name='user_id')
+        current_user = await self.principal_resolver.resolve(email)
+        user = await self.user_crud.get_by_pk(user_id)
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
         if user.email != current_user.email:
             raise HTTPException(status_code=403, detail="Forbidden to update")
 
         updated_user = await self.user_crud.update(user, user_data.dict())
+        await self.principal_resolver.invalidate(updated_user.email)
         return updated_user
 
     async def deactivate_user(self, user_id: int, user_data: DeactivateUserRequest) -> User:
-        user = await self.user_crud.get_by_field(user_id, field_name='user_id')
+        user = await self.user_crud.get_by_pk(user_id)
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
 
         deactivated_user = await self.user_crud.update(user, user_data.dict())
+        await self.principal_resolver.invalidate(deactivated_user.email)
         return deactivated_user
\ No newline at end of file
@@ -0,0 +1,88 @@
+import csv
+import gzip
+import os
+import uuid
+from typing import Callable, Iterable, Optional
+
+import pyarrow.parquet as pq
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from config import settings
+from db.models.models import Quiz, QuizResult
+from logger import logger
+from tasks.notification import create_postgres_connection
+from utils.columnar import COMPRESSION, quiz_results_schema, quiz_results_to_table
+
+COMPANY_EXPORT_FIELDS = ['result_id', 'user_id', 'quiz_id', 'question_id', 'user_answer_id', 'result', 'timestamp']
+COMPANY_EXPORT_EXTENSIONS = {"csv": "csv.gz", "parquet": "parquet"}
+PROGRESS_EVERY_ROWS = 10000
+
+
+def _write_csv(path: str, batches: Iterable[list], on_batch: Callable[[int], None]) -> None:
+    with gzip.open(path, "wt", newline="") as export_file:
+        writer = csv.writer(export_file)
+        writer.writerow(COMPANY_EXPORT_FIELDS)
+        for batch in batches:
+            writer.writerows(batch)
+            on_batch(len(batch))
+
+
+def _write_parquet(path: str, batches: Iterable[list], on_batch: Callable[[int], None]) -> None:
+    # every batch becomes a row group, so only one batch is ever held in memory
+    with pq.ParquetWriter(path, quiz_results_schema(COMPANY_EXPORT_FIELDS), compression=COMPRESSION) as writer:
+        for batch in batches:
+            writer.write_table(quiz_results_to_table(batch, COMPANY_EXPORT_FIELDS))
+            on_batch(len(batch))
+
+
+COMPANY_EXPORT_WRITERS = {"csv": _write_csv, "parquet": _write_parquet}
+
+
+def export_company_results(company_id: int, file_format: str = "csv",
+                           on_progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """Write all quiz results of the company's quizzes into a gzip CSV or Parquet file in EXPORT_DIR."""
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    file_name = f"company_{company_id}_results_{uuid.uuid4().hex}.{COMPANY_EXPORT_EXTENSIONS[file_format]}"
+    file_path = os.path.join(settings.EXPORT_DIR, file_name)
+    # the file only gets its final name once it is complete
+    tmp_path = f"{file_path}.part"
+
+    company_results = (select(*(getattr(QuizResult, field_name) for field_name in COMPANY_EXPORT_FIELDS))
+                       .join(Quiz, Quiz.quiz_id == QuizResult.quiz_id)
+                       .filter(Quiz.company_id == company_id))
+    count_stmt = (select(func.count()).select_from(QuizResult)
+                  .join(Quiz, Quiz.quiz_id == QuizResult.quiz_id)
+                  .filter(Quiz.company_id == company_id))
+
+    rows = 0
+    reported = 0
+    total = 0
+
+    def on_batch(batch_rows: int):
+        nonlocal rows, reported
+        rows += batch_rows
+        if on_progress and rows - reported >= PROGRESS_EVERY_ROWS:
+            on_progress(rows, total)
+            reported = rows
+
+    engine = create_postgres_connection()
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    try:
+        total = session.execute(count_stmt).scalar_one()
+        # yield_per streams the rows through a server-side cursor, memory stays flat for any company size
+        result = session.execute(company_results.execution_options(yield_per=settings.DATABASE_STREAM_YIELD_PER))
+        COMPANY_EXPORT_WRITERS[file_format](tmp_path, result.partitions(), on_batch)
+        os.replace(tmp_path, file_path)
+    except Exception as e:
+        logger.error(f"Error occurred: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        session.close()
+        # the engine is made for this run only, its pooled connections must not outlive it
+        engine.dispose()
+
+    return {"company_id": company_id, "file_path": file_path, "rows": rows, "total": total}
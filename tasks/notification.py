@@ -62,12 +62,14 @@ def get_all_user_answers(connection, user_id, quiz_id):
     return all_user_answers
 
 
-def create_notification(connection, user_id, notification_text):
+def save_notifications(connection, notifications: List[Notification]):
+    # one transaction for the whole scan instead of a commit per notification
+    if not notifications:
+        return
     try:
         Session = sessionmaker(bind=connection)
         session = Session()
-        notification = Notification(user_id=user_id, timestamp=datetime.utcnow(), status=True, text=notification_text)
-        session.add(notification)
+        session.add_all(notifications)
         session.commit()
     except Exception as e:
         logger.error(f"Error occurred: {e}")
@@ -79,41 +81,51 @@ def create_notification(connection, user_id, notification_text):
 def create_notifications():
     current_date = datetime.now()
     connection = create_postgres_connection()
-    all_users = get_all_company_members(connection)
-
-    for user in all_users:
-        user_id = user.user_id
-        company_id = user.company_id
-
-        quizzes = get_all_company_quizzes(connection, company_id)
-
-        for quiz in quizzes:
-            quiz_id = quiz.quiz_id
-            frequency = quiz.frequency_in_days
-
-            questions = get_all_questions(connection, quiz_id)
-            check_user_answers = get_all_user_answers(connection, user_id, quiz_id)
-
-            if not check_user_answers:
-                notification_text = f"Quiz {quiz.name} is available! Take the test right now!"
-                create_notification(connection, user_id, notification_text)
-
-            if len(check_user_answers) < len(questions):
-                notification_text = f"Complete the quiz {quiz.name}"
-                create_notification(connection, user_id, notification_text)
-
-            if len(check_user_answers) == len(questions):
-                last_user_answer = None
-                max_timestamp = None
-
-                for answer in check_user_answers:
-                    if max_timestamp is None or answer.timestamp > max_timestamp:
-                        max_timestamp = answer.timestamp
-                        last_user_answer = answer
-
-                if last_user_answer is not None and current_date - last_user_answer.timestamp >= timedelta(
-                        days=frequency):
-                    notification_text = f"The frequency in days {frequency} has already passed. Take the {quiz.name} test now!"
-                    create_notification(connection, user_id, notification_text)
-                else:
-                    continue
+    try:
+        all_users = get_all_company_members(connection)
+        notifications = []
+
+        for user in all_users:
+            user_id = user.user_id
+            company_id = user.company_id
+
+            quizzes = get_all_company_quizzes(connection, company_id)
+
+            for quiz in quizzes:
+                quiz_id = quiz.quiz_id
+                frequency = quiz.frequency_in_days
+
+                questions = get_all_questions(connection, quiz_id)
+                check_user_answers = get_all_user_answers(connection, user_id, quiz_id)
+
+                if not check_user_answers:
+                    notification_text = f"Quiz {quiz.name} is available! Take the test right now!"
+                    notifications.append(Notification(user_id=user_id, timestamp=datetime.utcnow(), status=True,
+                                                      text=notification_text))
+
+                if len(check_user_answers) < len(questions):
+                    notification_text = f"Complete the quiz {quiz.name}"
+                    notifications.append(Notification(user_id=user_id, timestamp=datetime.utcnow(), status=True,
+                                                      text=notification_text))
+
+                if len(check_user_answers) == len(questions):
+                    last_user_answer = None
+                    max_timestamp = None
+
+                    for answer in check_user_answers:
+                        if max_timestamp is None or answer.timestamp > max_timestamp:
+                            max_timestamp = answer.timestamp
+                            last_user_answer = answer
+
+                    if last_user_answer is not None and current_date - last_user_answer.timestamp >= timedelta(
+                            days=frequency):
+                        notification_text = f"The frequency in days {frequency} has already passed. Take the {quiz.name} test now!"
+                        notifications.append(Notification(user_id=user_id, timestamp=datetime.utcnow(), status=True,
+                                                          text=notification_text))
+                    else:
+                        continue
+
+        save_notifications(connection, notifications)
+    finally:
+        # the engine is made for this run only, its pooled connections must not outlive it
+        connection.dispose()
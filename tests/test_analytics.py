@@ -6,6 +6,11 @@ from httpx import AsyncClient
 import config
 from jose import jwt
 
+from conftest import TEST_DATABASE_URL
+from db.session import Replica, replica_router, get_redis, READ_PRIMARY_HEADER
+from services.principal import local_principals, principal_cache_key
+from utils.cache import cache_key
+
 
 @pytest.mark.asyncio
 async def test_user_gets_average_rating_about_himself(ac: AsyncClient):
@@ -111,3 +116,82 @@ async def test_company_get_all_users_and_last_completion_time(ac: AsyncClient):
     assert isinstance(data["items"], list)
     assert len(data["items"]) > 0
 
+
+
+@pytest.mark.runafter("test_concurrent_grading_grades_each_answer_once")
+@pytest.mark.asyncio
+async def test_user_gets_score_summary_about_himself(ac: AsyncClient):
+    email = "testemail4@example.com"  # user_id = 4
+    token_data = {"email": email}
+    token = jwt.encode(token_data, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await ac.get("/analytics/rating/summary", headers=headers)
+
+    assert response.status_code == 200
+    summary = response.json()
+
+    # the running totals must match the graded results one for one
+    results = (await ac.get("/export/json/4", headers=headers)).json()
+    assert len(results) > 0
+    assert summary["total_count"] == len(results)
+    assert summary["correct_count"] == sum(bool(result["result"]) for result in results)
+
+    quiz_ids = {result["quiz_id"] for result in results}
+    assert {quiz["quiz_id"] for quiz in summary["quizzes"]} == quiz_ids
+    for quiz in summary["quizzes"]:
+        quiz_results = [result for result in results if result["quiz_id"] == quiz["quiz_id"]]
+        assert quiz["total_count"] == len(quiz_results)
+        assert quiz["correct_count"] == sum(bool(result["result"]) for result in quiz_results)
+
+
+@pytest.mark.runafter("test_user_gets_score_summary_about_himself")
+@pytest.mark.asyncio
+async def test_replica_reads_do_not_fill_the_results_cache(ac: AsyncClient):
+    # a "replica" on the test database; a real one may lag behind the version bump of a grading
+    replica = Replica(TEST_DATABASE_URL, retry_interval=30)
+    replica_router.replicas.append(replica)
+    redis = get_redis()
+    data_key = cache_key("quiz_results", "data", 4)
+    token = jwt.encode({"email": "testemail4@example.com"}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        await redis.delete(data_key)
+        response = await ac.get("/analytics/quizzes/last_completed", headers=headers)
+        assert response.status_code == 200
+        assert replica.engine.pool.statistics.checkouts > 0
+        assert await redis.get(data_key) is None
+
+        response = await ac.get("/analytics/quizzes/last_completed", headers={**headers, READ_PRIMARY_HEADER: "1"})
+        assert response.status_code == 200
+        assert await redis.get(data_key) is not None
+    finally:
+        replica_router.replicas.remove(replica)
+        await replica.engine.dispose()
+
+
+@pytest.mark.runafter("test_user_gets_score_summary_about_himself")
+@pytest.mark.asyncio
+async def test_replica_reads_do_not_fill_the_principal_cache(ac: AsyncClient):
+    replica = Replica(TEST_DATABASE_URL, retry_interval=30)
+    replica_router.replicas.append(replica)
+    redis = get_redis()
+    email = "testemail4@example.com"
+    token = jwt.encode({"email": email}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+    try:
+        local_principals.pop(email)
+        await redis.delete(principal_cache_key(email))
+        response = await ac.get("/analytics/rating/summary", headers=headers)
+        assert response.status_code == 200
+        assert replica.engine.pool.statistics.checkouts > 0
+        assert local_principals.get(email) is None
+        assert await redis.get(principal_cache_key(email)) is None
+
+        response = await ac.get("/analytics/rating/summary", headers={**headers, READ_PRIMARY_HEADER: "1"})
+        assert response.status_code == 200
+        assert local_principals.get(email) is not None
+        assert await redis.get(principal_cache_key(email)) is not None
+    finally:
+        replica_router.replicas.remove(replica)
+        await replica.engine.dispose()
@@ -3,6 +3,12 @@ from fastapi import status
 from httpx import AsyncClient
 import config
 from jose import jwt
+from sqlalchemy import update
+
+from conftest import async_session_test
+from db.models.models import CompanyMembership, CompanyRole
+from db.session import get_redis
+from services.authorization import CompanyAccessResolver, local_company_access, shared_company_key
 
 
 # Test for the creation of a company
@@ -456,3 +462,94 @@ async def test_get_company_admins(ac: AsyncClient):
     assert "items" in data
     assert isinstance(data["items"], list)
     assert len(data["items"]) > 0
+
+
+# A role change must be seen by the very next request, whatever was cached before it
+@pytest.mark.runafter("test_company_deactivate_user_in_company")
+@pytest.mark.asyncio
+async def test_role_change_seen_on_next_request(ac: AsyncClient):
+    company_id = 4
+    user_id = 4
+    token = jwt.encode({"email": "testemail4@example.com"}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # admin since test_company_change_user_role_in_company, this request caches the role
+    response = await ac.get(f"/company/{company_id}/quizzes", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await ac.put(f"/company/{company_id}/changed_user/{user_id}",
+                            json={"user_id": user_id, "role_type": "user"},
+                            headers={"Authorization": f"Bearer {ACCESS_TOKEN}"})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await ac.get(f"/company/{company_id}/quizzes", headers=headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = await ac.put(f"/company/{company_id}/changed_user/{user_id}",
+                            json={"user_id": user_id, "role_type": "admin"},
+                            headers={"Authorization": f"Bearer {ACCESS_TOKEN}"})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await ac.get(f"/company/{company_id}/quizzes", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+# An inactive role grants nothing, even if its role_type is admin
+@pytest.mark.runafter("test_role_change_seen_on_next_request")
+@pytest.mark.asyncio
+async def test_inactive_role_grants_no_access(ac: AsyncClient):
+    company_id = 4
+    user_id = 4
+    token = jwt.encode({"email": "testemail4@example.com"}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def set_role_active(is_active: bool):
+        async with async_session_test() as session:
+            await session.execute(update(CompanyRole).filter(CompanyRole.company_id == company_id,
+                                                             CompanyRole.user_id == user_id)
+                                  .values(is_active=is_active))
+            await session.commit()
+            await CompanyAccessResolver(session, get_redis()).invalidate(user_id, company_id)
+
+    await set_role_active(False)
+    try:
+        response = await ac.get(f"/company/{company_id}/quizzes", headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+    finally:
+        await set_role_active(True)
+
+    response = await ac.get(f"/company/{company_id}/quizzes", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+# A membership change drops this worker's shared-company answers about the user
+@pytest.mark.runafter("test_inactive_role_grants_no_access")
+@pytest.mark.asyncio
+async def test_invalidate_drops_local_shared_company_entries():
+    async with async_session_test() as session:
+        memberships = (await session.execute(
+            CompanyMembership.__table__.select().filter(CompanyMembership.is_active == True))).all()
+        by_company = {}
+        for membership in memberships:
+            by_company.setdefault(membership.company_id, []).append(membership.user_id)
+        user_id, other_user_id = next(users[:2] for users in by_company.values() if len(users) > 1)
+
+        resolver = CompanyAccessResolver(session, get_redis())
+        assert await resolver.shares_active_company(user_id, other_user_id)
+        assert local_company_access.get(shared_company_key(user_id, other_user_id)) is True
+
+        # any company of the user, not only the shared one
+        await resolver.invalidate(user_id, 0)
+        assert local_company_access.get(shared_company_key(user_id, other_user_id)) is None
+@pytest.mark.runafter("test_user_leave_company")
+@pytest.mark.asyncio
+async def test_membership_removal_seen_on_next_request(ac: AsyncClient):
+    company_id = 2
+    token = jwt.encode({"email": "testemail3@example.com"}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+
+    # the membership check of test_user_leave_company was cached before the user left
+    response = await ac.put(f"/users_leave_company/{company_id}", json={"is_active": False},
+                            headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == "Not found user in company"
@@ -0,0 +1,138 @@
+import pytest
+from sqlalchemy import event, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models.models import (Answer, Company, CompanyMembership, CompanyRequest, CompanyRole, Notification, Question,
+                              Quiz, QuizResult, RequestCreatedBy, RequestStatus, RoleType, User, UserAnswers)
+from db.session import get_redis
+from schemas.quizzes import QuizResultCreate
+from services.authorization import CompanyAccessResolver
+from services.company import CompanyService
+from services.notifications import NotificationsService
+from services.principal import PRINCIPAL_FIELDS, PrincipalResolver
+from services.quiz_snapshot import QuizSnapshotCache
+from services.quizzes import QuizService
+from conftest import engine_test
+
+# explicit ids far above the ones the other tests get, so no sequence is consumed
+SEED_ID = 1_000_000
+# enough rows that a sequential scan is never the cheaper plan for a single user, company or quiz
+SEED_USERS = 5000
+USER_ID, OTHER_USER_ID = SEED_ID, SEED_ID + 1
+# user USER_ID shares company COMPANY_ID with OTHER_USER_ID and owns quiz QUIZ_ID
+COMPANY_ID = QUIZ_ID = SEED_ID
+QUESTION_ID = SEED_ID
+
+
+def seed_email(i: int) -> str:
+    return f"index-seed-{i}@example.com"
+
+
+SEED_ROWS = [
+    (User, [{"user_id": SEED_ID + i, "name": "Seed", "surname": "User", "email": seed_email(i),
+             "hashed_password": "-"} for i in range(SEED_USERS)]),
+    (Company, [{"company_id": SEED_ID + i, "name": f"Seed company {i}", "owner_id": SEED_ID + i}
+               for i in range(SEED_USERS)]),
+    (CompanyMembership, [{"user_id": SEED_ID + i, "company_id": SEED_ID + i // 2} for i in range(SEED_USERS)]),
+    (CompanyRole, [{"role_id": SEED_ID + i, "user_id": SEED_ID + i, "company_id": SEED_ID + i // 2,
+                    "role_type": RoleType.USER} for i in range(SEED_USERS)]),
+    (CompanyRequest, [{"request_id": SEED_ID + i, "user_id": SEED_ID + i, "company_id": SEED_ID + i * 7 % SEED_USERS,
+                       "status": RequestStatus.PENDING,
+                       "created_by": RequestCreatedBy.COMPANY if i % 2 else RequestCreatedBy.USER}
+                      for i in range(SEED_USERS)]),
+    (Quiz, [{"quiz_id": SEED_ID + i, "company_id": SEED_ID + i, "author_id": SEED_ID + i, "name": f"Seed quiz {i}",
+             "description": "-", "frequency_in_days": 1} for i in range(SEED_USERS)]),
+    # two questions per quiz, two answers per question, the first one correct
+    (Question, [{"question_id": SEED_ID + i, "quiz_id": SEED_ID + i // 2, "question_text": "-"}
+                for i in range(2 * SEED_USERS)]),
+    (Answer, [{"answer_id": SEED_ID + i, "quiz_id": SEED_ID + i // 4, "question_id": SEED_ID + i // 2,
+               "answer_text": "-", "is_correct": i % 2 == 0} for i in range(4 * SEED_USERS)]),
+    # every user answered both questions of their own quiz
+    (UserAnswers, [{"user_answer_id": SEED_ID + i, "user_id": SEED_ID + i // 2, "quiz_id": SEED_ID + i // 2,
+                    "question_id": SEED_ID + i, "answer_id": SEED_ID + 2 * i} for i in range(2 * SEED_USERS)]),
+    # all graded except the answers of USER_ID
+    (QuizResult, [{"result_id": SEED_ID + i, "user_id": SEED_ID + i // 2, "quiz_id": SEED_ID + i // 2,
+                   "question_id": SEED_ID + i, "user_answer_id": SEED_ID + i, "result": True}
+                  for i in range(2, 2 * SEED_USERS)]),
+    (Notification, [{"notification_id": SEED_ID + i, "user_id": SEED_ID + i // 4, "text": "-", "status": i % 2 == 0}
+                    for i in range(4 * SEED_USERS)]),
+]
+
+
+async def cursor_pages(crud, **kwargs):
+    # the first page and the one after it, both run the same ordering as the routes
+    _, cursor = await crud.get_cursor_page(None, 1, order_by=['timestamp'], descending=True, **kwargs)
+    await crud.get_cursor_page(cursor, 1, order_by=['timestamp'], descending=True, **kwargs)
+
+
+async def export_rows(quiz_service: QuizService):
+    return [row async for row in quiz_service._iter_export_rows(USER_ID)]
+
+
+# the calls the services make on every request, each runs the statements the service itself builds
+SERVICE_CALLS = {
+    "principal_by_email": lambda session, redis: PrincipalResolver(session, redis).user_crud.get_columns(
+        PRINCIPAL_FIELDS, email=seed_email(0)),
+    "company_access": lambda session, redis: CompanyAccessResolver(session, redis)._load(USER_ID, COMPANY_ID),
+    "shared_company": lambda session, redis: CompanyAccessResolver(session, redis)._load_shared(USER_ID,
+                                                                                                OTHER_USER_ID),
+    "company_members": lambda session, redis: QuizService(session, redis).find_all_company_members_by_company_id(
+        COMPANY_ID),
+    "company_role": lambda session, redis: CompanyService(session, redis).company_role_crud.get_by_fields(
+        company_id=COMPANY_ID, user_id=USER_ID),
+    "company_requests": lambda session, redis: CompanyService(session, redis).get_all_request_from_company_to_users(
+        COMPANY_ID),
+    "company_quizzes": lambda session, redis: QuizService(session, redis).get_all_company_quizzes(COMPANY_ID),
+    "quiz_snapshot": lambda session, redis: QuizSnapshotCache(session, redis)._load(QUIZ_ID),
+    "questions_by_quiz": lambda session, redis: QuizService(session, redis).get_all_questions(QUIZ_ID),
+    "answers_by_question": lambda session, redis: QuizService(session, redis).get_all_answer(QUESTION_ID),
+    "user_answers_by_quiz": lambda session, redis: QuizService(session, redis).get_all_user_answers(USER_ID, QUIZ_ID),
+    "user_answers_by_cursor": lambda session, redis: cursor_pages(QuizService(session, redis).user_answer_crud,
+                                                                  user_id=USER_ID),
+    "quiz_results_by_cursor": lambda session, redis: cursor_pages(QuizService(session, redis).quiz_result_crud,
+                                                                  user_id=OTHER_USER_ID),
+    "export": lambda session, redis: export_rows(QuizService(session, redis)),
+    "grading": lambda session, redis: QuizService(session, redis)._create_quiz_result(
+        QuizResultCreate(user_id=USER_ID)),
+    "active_notifications": lambda session, redis: NotificationsService(session, redis).notification_crud.get_all(
+        user_id=USER_ID, status=True),
+    "notifications_by_cursor": lambda session, redis: cursor_pages(
+        NotificationsService(session, redis).notification_crud, user_id=USER_ID),
+}
+
+
+@pytest.fixture(scope="module")
+async def seeded_conn():
+    async with engine_test.connect() as conn:
+        transaction = await conn.begin()
+        for model, rows in SEED_ROWS:
+            await conn.execute(insert(model), rows)
+        # the planner picks its plans from these statistics, as it would on a production database
+        await conn.execute(text("ANALYZE"))
+        yield conn
+        await transaction.rollback()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", SERVICE_CALLS)
+async def test_service_query_uses_index(seeded_conn, name):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "WITH"):
+            statements.append((statement, tuple(parameters)))
+
+    event.listen(seeded_conn.sync_connection, "before_cursor_execute", capture)
+    try:
+        # the services commit; on the joined transaction that only releases a savepoint, the seed stays in place
+        async with AsyncSession(bind=seeded_conn, join_transaction_mode="create_savepoint",
+                                expire_on_commit=False) as session:
+            await SERVICE_CALLS[name](session, get_redis())
+    finally:
+        event.remove(seeded_conn.sync_connection, "before_cursor_execute", capture)
+
+    assert statements
+    for statement, parameters in statements:
+        result = await seeded_conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        plan = "\n".join(row[0] for row in result)
+        assert "Seq Scan" not in plan, f"{statement}\n{plan}"
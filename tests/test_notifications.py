@@ -3,6 +3,9 @@ from httpx import AsyncClient
 import config
 from jose import jwt
 
+from db.models.models import Notification
+from conftest import async_session_test
+
 
 @pytest.mark.asyncio
 async def test_user_get_active_notifications(ac: AsyncClient):
@@ -36,3 +39,32 @@ async def test_user_get_active_notifications(ac: AsyncClient):
     assert "timestamp" in data
     assert "status" in data
     assert "text" in data
+
+
+@pytest.mark.runafter("test_user_get_active_notifications")
+@pytest.mark.asyncio
+async def test_notifications_cursor_walks_rows_without_timestamp(ac: AsyncClient):
+    email = "testemail4@example.com"  # user_id = 4
+    token = jwt.encode({"email": email}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with async_session_test() as session:
+        untimed = [Notification(user_id=4, text="no timestamp", timestamp=None) for _ in range(3)]
+        session.add_all(untimed)
+        await session.commit()
+    untimed_ids = {notification.notification_id for notification in untimed}
+
+    seen, cursor = [], None
+    while True:
+        params = {"size": 2, **({"cursor": cursor} if cursor else {})}
+        response = await ac.get("/notifications/cursor/", params=params, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        seen += [notification["notification_id"] for notification in data["items"]]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+
+    # every notification exactly once, the ones without a timestamp included
+    assert len(seen) == len(set(seen))
+    assert untimed_ids <= set(seen)
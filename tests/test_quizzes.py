@@ -1,7 +1,11 @@
+import asyncio
+
 import pytest
 from fastapi import status
 from httpx import AsyncClient
 import config
+import pyarrow as pa
+import pyarrow.parquet as pq
 from jose import jwt
 
 @pytest.mark.runafter("test_company_change_user_role_in_company")
@@ -161,6 +165,77 @@ async def test_get_quiz_by_id(ac: AsyncClient):
     assert "is_active" in data
 
 
+def quiz_payload(company_id: int, name: str) -> dict:
+    return {
+        "company_id": company_id,
+        "name": name,
+        "description": "bla bla bla bla",
+        "frequency_in_days": 2,
+        "is_active": "true",
+        "questions": [{
+            "question_text": f"{number} question_text",
+            "is_active": "true",
+            "answers": [{"answer_text": "first answer_text", "is_correct": "true"},
+                        {"answer_text": "second answer_text", "is_correct": "false"}]
+        } for number in ("first", "second")]
+    }
+
+
+@pytest.mark.runafter("test_create_quiz")
+@pytest.mark.asyncio
+async def test_quiz_snapshot_follows_updates(ac: AsyncClient):
+    company_id = 4
+    quiz_id = 2
+    email = "testemail2@example.com"  # user_id = 2
+    token = jwt.encode({"email": email}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # served from the snapshot from now on
+    response = await ac.get(f"/company/{company_id}/quiz/{quiz_id}", headers=headers)
+    assert response.status_code == 200
+    quiz = response.json()
+
+    quiz_data = {
+        "name": "Renamed quiz",
+        "description": quiz["description"],
+        "frequency_in_days": quiz["frequency_in_days"],
+        "is_active": quiz["is_active"]
+    }
+    response = await ac.put(f"/company/{company_id}/quiz/{quiz_id}", json=quiz_data, headers=headers)
+    assert response.status_code == 200
+
+    response = await ac.get(f"/company/{company_id}/quiz/{quiz_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Renamed quiz"
+
+
+@pytest.mark.runafter("test_create_quiz")
+@pytest.mark.asyncio
+async def test_quiz_snapshot_follows_creation(ac: AsyncClient):
+    company_id = 4
+    email = "testemail2@example.com"  # user_id = 2
+    token = jwt.encode({"email": email}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = await ac.post(f"/company/{company_id}/quiz", json=quiz_payload(company_id, "snapshot quiz"),
+                             headers=headers)
+    assert response.status_code == 200
+    next_quiz_id = response.json()["quiz_id"] + 1
+
+    # the lookup of a quiz that does not exist yet is cached as well
+    response = await ac.get(f"/company/{company_id}/quiz/{next_quiz_id}", headers=headers)
+    assert response.status_code == 404
+
+    response = await ac.post(f"/company/{company_id}/quiz", json=quiz_payload(company_id, "next snapshot quiz"),
+                             headers=headers)
+    assert response.status_code == 200
+    assert response.json()["quiz_id"] == next_quiz_id
+
+    response = await ac.get(f"/company/{company_id}/quiz/{next_quiz_id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["name"] == "next snapshot quiz"
+
+
 @pytest.mark.asyncio
 async def test_get_all_quizzes_by_company(ac: AsyncClient):
     company_id = 1
@@ -175,6 +250,9 @@ async def test_get_all_quizzes_by_company(ac: AsyncClient):
     assert "items" in data
     assert isinstance(data["items"], list)
     assert len(data["items"]) > 0
+    # only the company's own active quizzes, counted the same way
+    assert all(quiz["company_id"] == company_id and quiz["is_active"] for quiz in data["items"])
+    assert data["total"] == len(data["items"])
 
 
 
@@ -316,6 +394,27 @@ async def test_create_user_answer(ac: AsyncClient):
     assert "answer_id" in data
 
 
+@pytest.mark.runafter("test_create_user_answer")
+@pytest.mark.asyncio
+async def test_create_user_answer_from_other_question(ac: AsyncClient):
+    company_id = 4
+    user_answer_data = {
+        "quiz_id": 2,
+        "question_id": 4,
+        "answer_id": 1  # belongs to question 1 of quiz 1
+    }
+    email = "testemail4@example.com"
+    token_data = {"email": email}
+    token = jwt.encode(token_data, config.SECRET_KEY, algorithm=config.ALGORITHM)
+
+    response = await ac.post(f"/company/{company_id}/quiz/2/question/4/user_answer/",
+                             json=user_answer_data,
+                             headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "No answer found"
+
+
 @pytest.mark.runafter("test_create_user_answer")
 @pytest.mark.asyncio
 async def test_create_quiz_result(ac: AsyncClient):
@@ -335,3 +434,106 @@ async def test_create_quiz_result(ac: AsyncClient):
 
     data = response.json()
     assert len(data) > 0
+
+
+@pytest.mark.runafter("test_create_quiz_result")
+@pytest.mark.asyncio
+async def test_concurrent_grading_grades_each_answer_once(ac: AsyncClient):
+    company_id = 4
+    user_answer_data = {
+        "quiz_id": 2,
+        "question_id": 4,
+        "answer_id": 10
+    }
+    user_token = jwt.encode({"email": "testemail4@example.com"}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    response = await ac.post(f"/company/{company_id}/quiz/2/question/4/user_answer/", json=user_answer_data,
+                             headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 200
+
+    token = jwt.encode({"email": "testemail2@example.com"}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    first, second = await asyncio.gather(*(
+        ac.post("/companies/quizzes/result/", json={"user_id": 4, "quiz_id": 2},
+                headers={"Authorization": f"Bearer {token}"})
+        for _ in range(2)))
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    # the new answer is graded by exactly one of the two requests
+    assert len(first.json()) + len(second.json()) == 1
+
+
+@pytest.mark.runafter("test_create_quiz_result")
+@pytest.mark.asyncio
+async def test_export_csv_data(ac: AsyncClient):
+    user_id = 4
+    email = "testemail4@example.com"
+    token_data = {"email": email}
+    token = jwt.encode(token_data, config.SECRET_KEY, algorithm=config.ALGORITHM)
+
+    response = await ac.get(f"/export/csv/{user_id}/download/", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+
+    lines = response.text.splitlines()
+    assert lines[0] == "user_id,quiz_id,question_id,user_answer_id,result,company_id"
+    assert len(lines) > 1
+
+
+@pytest.mark.runafter("test_export_csv_data")
+@pytest.mark.asyncio
+async def test_export_json_data(ac: AsyncClient):
+    user_id = 4
+    email = "testemail4@example.com"
+    token_data = {"email": email}
+    token = jwt.encode(token_data, config.SECRET_KEY, algorithm=config.ALGORITHM)
+
+    # the second request is served from the cache and has to return the same data
+    first = await ac.get(f"/export/json/{user_id}", headers={"Authorization": f"Bearer {token}"})
+    second = await ac.get(f"/export/json/{user_id}", headers={"Authorization": f"Bearer {token}"})
+
+    assert first.status_code == 200
+    assert second.json() == first.json()
+    assert len(first.json()) > 0
+    assert set(first.json()[0]) == {"user_id", "quiz_id", "question_id", "user_answer_id", "result", "company_id"}
+
+
+@pytest.mark.runafter("test_export_json_data")
+@pytest.mark.asyncio
+async def test_export_parquet_data(ac: AsyncClient, tmp_path):
+    user_id = 4
+    email = "testemail4@example.com"
+    token_data = {"email": email}
+    token = jwt.encode(token_data, config.SECRET_KEY, algorithm=config.ALGORITHM)
+
+    response = await ac.get(f"/export/parquet/{user_id}/download/", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+
+    path = tmp_path / "data.parquet"
+    path.write_bytes(response.content)
+    table = pq.read_table(path, memory_map=True)
+    assert table.column_names == ["user_id", "quiz_id", "question_id", "user_answer_id", "result", "company_id"]
+    assert table.num_rows > 0
+    assert set(table.column("user_id").to_pylist()) == {user_id}
+
+
+@pytest.mark.runafter("test_export_parquet_data")
+@pytest.mark.asyncio
+async def test_export_arrow_data(ac: AsyncClient, tmp_path):
+    user_id = 4
+    email = "testemail4@example.com"
+    token_data = {"email": email}
+    token = jwt.encode(token_data, config.SECRET_KEY, algorithm=config.ALGORITHM)
+
+    response = await ac.get(f"/export/arrow/{user_id}/download/", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+
+    path = tmp_path / "data.arrow"
+    path.write_bytes(response.content)
+    with pa.memory_map(str(path)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    assert table.num_rows > 0
+    assert pa.types.is_dictionary(table.schema.field("quiz_id").type)
+    assert table.column("result").type == pa.bool_()
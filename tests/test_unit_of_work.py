@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import text
+
+from db.models.models import Notification
+from db.unit_of_work import UnitOfWork
+from managers.base_manager import CRUDBase
+from conftest import async_session_test
+
+
+@pytest.mark.runafter("test_create_user")
+@pytest.mark.asyncio
+async def test_unit_of_work_rolls_back_on_error():
+    text_marker = "unit of work rollback"
+
+    async with async_session_test() as session:
+        notification_crud = CRUDBase[Notification](Notification, session)
+        with pytest.raises(RuntimeError):
+            async with UnitOfWork(session):
+                # only flushed inside the unit of work, the insert is part of the open transaction
+                await notification_crud.create(Notification(user_id=1, text=text_marker))
+                await notification_crud.create(Notification(user_id=1, text=text_marker))
+                raise RuntimeError("fail after the writes")
+
+    async with async_session_test() as session:
+        assert await CRUDBase[Notification](Notification, session).count(text=text_marker) == 0
+
+
+@pytest.mark.runafter("test_create_user")
+@pytest.mark.asyncio
+@pytest.mark.parametrize("errcode", ["serialization_failure", "deadlock_detected"])
+async def test_unit_of_work_retries_serialization_failures(errcode):
+    text_marker = f"unit of work retry {errcode}"
+    attempts = []
+
+    async with async_session_test() as session:
+        notification_crud = CRUDBase[Notification](Notification, session)
+
+        async def write():
+            attempts.append(1)
+            await notification_crud.create(Notification(user_id=1, text=text_marker))
+            if len(attempts) == 1:
+                # a real 40001 / 40P01 from Postgres, raised after the first write
+                await session.execute(text(f"DO $$ BEGIN RAISE EXCEPTION 'conflict' USING ERRCODE = '{errcode}'; "
+                                           f"END $$"))
+
+        await UnitOfWork(session, retry_delay=0).run(write)
+
+    assert len(attempts) == 2
+    async with async_session_test() as session:
+        # the failed attempt was rolled back, only the retry was committed
+        assert await CRUDBase[Notification](Notification, session).count(text=text_marker) == 1
@@ -1,10 +1,18 @@
+import asyncio
+import base64
+import json
+import threading
+
 import pytest
-from fastapi import status
+from datetime import datetime, timedelta
+from fastapi import status, HTTPException
 from httpx import AsyncClient
 from fastapi.security import HTTPAuthorizationCredentials
 import config
 from jose import jwt
-from utils.security import decode_bearer_token, encode_bearer_token
+from utils.security import (decode_bearer_token, encode_bearer_token, JWTBackend, JoseBackend, InvalidTokenError,
+                            TokenSigningError)
+from utils.hashing import PasswordHashExecutor, password_hash_executor
 
 
 @pytest.mark.first
@@ -85,6 +93,94 @@ async def test_login(ac: AsyncClient):
     assert decoded_token_data["email"] == login_data["email"]
 
 
+@pytest.mark.runafter("test_login")
+@pytest.mark.asyncio
+async def test_login_rejected_when_password_hashing_is_saturated(ac: AsyncClient):
+    login_data = {
+        "email": "testemail@example.com",
+        "password": "string",
+    }
+    max_pending = password_hash_executor.max_pending
+    # one bcrypt call at a time, every login arriving while it runs is refused
+    password_hash_executor.max_pending = 1
+    try:
+        responses = await asyncio.gather(*(ac.post("/auth/login", json=login_data) for _ in range(5)))
+    finally:
+        password_hash_executor.max_pending = max_pending
+
+    status_codes = [response.status_code for response in responses]
+    assert status.HTTP_200_OK in status_codes
+    assert status.HTTP_503_SERVICE_UNAVAILABLE in status_codes
+    rejected = next(response for response in responses if response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE)
+    assert rejected.json()["detail"] == "Too many requests, try again later"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_password_hash_frees_its_slot():
+    executor = PasswordHashExecutor(max_workers=1, max_pending=2)
+    running, release = threading.Event(), threading.Event()
+
+    def blocking_hash():
+        running.set()
+        release.wait(5)
+        return "hash"
+
+    try:
+        busy = asyncio.create_task(executor.run("hash", blocking_hash))
+        await asyncio.get_running_loop().run_in_executor(None, running.wait, 5)
+        # the second call waits for the only worker thread, the third one is cancelled while bcrypt runs
+        queued = asyncio.create_task(executor.run("hash", blocking_hash))
+        await asyncio.sleep(0)
+        assert executor.pending == 2
+        queued.cancel()
+        busy.cancel()
+        await asyncio.gather(busy, queued, return_exceptions=True)
+        # the queued call never started and gave its slot back, the running one keeps it until bcrypt returns
+        assert executor.pending == 1
+
+        release.set()
+        for _ in range(100):
+            if executor.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.pending == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+
+def test_decode_bearer_token_cache():
+    token = jwt.encode({"email": "testemail@example.com"}, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    credentials = HTTPAuthorizationCredentials(scheme="bearer", credentials=token)
+
+    # the second call is served from the verified-token cache and must not share state with the first
+    first = decode_bearer_token(credentials)
+    first["email"] = "changed@example.com"
+    assert decode_bearer_token(credentials)["email"] == "testemail@example.com"
+
+    expired = jwt.encode({"email": "testemail@example.com", "exp": datetime.utcnow() - timedelta(seconds=1)},
+                         config.SECRET_KEY, algorithm=config.ALGORITHM)
+    with pytest.raises(HTTPException):
+        decode_bearer_token(HTTPAuthorizationCredentials(scheme="bearer", credentials=expired))
+
+    tampered = HTTPAuthorizationCredentials(scheme="bearer", credentials=token[:-2] + "xx")
+    with pytest.raises(HTTPException):
+        decode_bearer_token(tampered)
+
+
+def test_jwt_backend_errors_are_normalised():
+    with pytest.raises(TypeError):
+        JWTBackend(config.ALGORITHM, config.SECRET_KEY, config.SECRET_KEY)
+
+    # a verify-only service has no private key, a broken PEM file fails to load
+    for signing_key in (None, "not a pem key"):
+        with pytest.raises(TokenSigningError):
+            JoseBackend("RS256", signing_key, "not a pem key").encode({"email": "testemail@example.com"})
+    with pytest.raises(InvalidTokenError):
+        JoseBackend("RS256", None, "not a pem key").decode("not.a.token")
+
+
 # Test for route /auth/me
 @pytest.mark.asyncio
 async def test_get_me(ac: AsyncClient):
@@ -129,6 +225,39 @@ async def test_get_all_users(ac: AsyncClient):
     assert len(data["items"]) > 0
 
 
+# Test to walk all users page by page with a cursor
+@pytest.mark.asyncio
+async def test_get_users_by_cursor(ac: AsyncClient):
+    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+    response = await ac.get("/users/cursor/?size=2", headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+
+    data = response.json()
+    assert len(data["items"]) == 2
+    assert data["next_cursor"] is not None
+
+    next_response = await ac.get(f"/users/cursor/?size=2&cursor={data['next_cursor']}", headers=headers)
+    assert next_response.status_code == status.HTTP_200_OK
+    next_items = next_response.json()["items"]
+    assert next_items[0]["user_id"] > data["items"][-1]["user_id"]
+
+    invalid_response = await ac.get("/users/cursor/?cursor=not-a-cursor", headers=headers)
+    assert invalid_response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# Test that a well-formed cursor holding values of the wrong type is rejected
+@pytest.mark.asyncio
+@pytest.mark.parametrize("values", [["abc"], [True], [1.5], [[1]]])
+async def test_get_users_by_forged_cursor(ac: AsyncClient, values):
+    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+    cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+    response = await ac.get(f"/users/cursor/?cursor={cursor}", headers=headers)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
 @pytest.mark.asyncio
 async def test_update_user(ac: AsyncClient):
     user_id = 1
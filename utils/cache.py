@@ -0,0 +1,261 @@
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence
+
+import redis.asyncio as aioredis
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+
+from config import settings
+from db.session import is_replica_session
+from logger import logger
+from utils import serialization
+
+CACHE_VERSION = "v1"
+
+cache_requests = Counter("company_api_cache_requests_total", "Cache lookups by cache and outcome",
+                         ["cache", "outcome"])
+cache_errors = Counter("company_api_cache_errors_total", "Redis errors while using a cache", ["cache"])
+
+
+def cache_key(*parts: Any) -> str:
+    """company_api:v1:<parts...>, nothing this app stores in Redis can collide with other users of the server."""
+    return ":".join([settings.CACHE_NAMESPACE, CACHE_VERSION, *map(str, parts)])
+
+
+class TTLCache:
+    """Small in-process LRU whose entries also expire after `ttl` seconds.
+
+    Meant for data that is read on almost every request and may be a few seconds stale in the other
+    workers after a change, e.g. the authenticated user. Not shared between processes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Any) -> None:
+        self._entries.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[Any], bool]) -> None:
+        """Drop every key the predicate accepts, a full scan: for invalidations, not for the read path."""
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class VersionedCache:
+    """Cache-aside over Redis for data that belongs to one owner id, e.g. all quiz results of a user.
+
+    Every entry is stored together with the stamp it was loaded under: the cache-wide generation and the
+    owner's version. invalidate() bumps the owner's version, invalidate_all() the generation, and an entry
+    whose stamp is not the current one counts as a miss. The stamp is read before the database, so a load
+    that races with a write is stored under the old stamp and never served.
+
+    A replica may not have the write yet when the stamp is already bumped, so with fills_cache=False
+    (a replica session) misses are loaded but never stored.
+    """
+
+    name: str = ""
+
+    def __init__(self, redis: aioredis.Redis, ttl: int, fills_cache: bool = True):
+        self.redis = redis
+        self.ttl = ttl
+        self.fills_cache = fills_cache
+
+    def dumps(self, value: Any) -> Any:
+        return value
+
+    def loads(self, value: Any) -> Any:
+        return value
+
+    def _data_key(self, owner_id: Any) -> str:
+        return cache_key(self.name, "data", owner_id)
+
+    def _version_key(self, owner_id: Any) -> str:
+        return cache_key(self.name, "version", owner_id)
+
+    @property
+    def _generation_key(self) -> str:
+        return cache_key(self.name, "generation")
+
+    @staticmethod
+    def _stamp(generation: Optional[bytes], version: Optional[bytes]) -> str:
+        return f"{int(generation or 0)}.{int(version or 0)}"
+
+    async def _read(self, owner_ids: Sequence[Any]) -> tuple:
+        """One MGET for the generation, the owners' versions and their entries."""
+        keys = ([self._generation_key] + [self._version_key(owner_id) for owner_id in owner_ids]
+                + [self._data_key(owner_id) for owner_id in owner_ids])
+        values = await self.redis.mget(keys)
+        generation, versions, entries = values[0], values[1:len(owner_ids) + 1], values[len(owner_ids) + 1:]
+
+        stamps, cached = {}, {}
+        for owner_id, version, entry in zip(owner_ids, versions, entries):
+            stamps[owner_id] = self._stamp(generation, version)
+            if entry is None:
+                cache_requests.labels(self.name, "miss").inc()
+                continue
+            stamp, value = serialization.loads(entry)
+            if stamp != stamps[owner_id]:
+                cache_requests.labels(self.name, "stale").inc()
+                continue
+            cache_requests.labels(self.name, "hit").inc()
+            cached[owner_id] = self.loads(value)
+        return stamps, cached
+
+    async def _write(self, values: Dict[Any, Any], stamps: Dict[Any, str]) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for owner_id, value in values.items():
+                entry = serialization.dumps([stamps[owner_id], self.dumps(value)])
+                pipe.set(self._data_key(owner_id), entry, ex=self.ttl)
+            await pipe.execute()
+
+    async def get_or_load(self, owner_id: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            stamps, cached = await self._read([owner_id])
+        except RedisError as exc:
+            # the cache must never take the endpoint down, fall back to the database
+            cache_errors.labels(self.name).inc()
+            logger.warning(f"{self.name} cache unavailable: {exc}")
+            return await loader()
+        if owner_id in cached:
+            return cached[owner_id]
+
+        value = await loader()
+        if not self.fills_cache:
+            return value
+        try:
+            await self._write({owner_id: value}, stamps)
+        except RedisError as exc:
+            cache_errors.labels(self.name).inc()
+            logger.warning(f"{self.name} cache unavailable: {exc}")
+        return value
+
+    async def get_many_or_load(self, owner_ids: Iterable[Any],
+                               loader: Callable[[List[Any]], Awaitable[Dict[Any, Any]]]) -> Dict[Any, Any]:
+        """get_or_load for many owners: one MGET, and one loader call for all the misses."""
+        owner_ids = list(dict.fromkeys(owner_ids))
+        if not owner_ids:
+            return {}
+        try:
+            stamps, cached = await self._read(owner_ids)
+        except RedisError as exc:
+            cache_errors.labels(self.name).inc()
+            logger.warning(f"{self.name} cache unavailable: {exc}")
+            return await loader(owner_ids)
+
+        missing = [owner_id for owner_id in owner_ids if owner_id not in cached]
+        if missing:
+            loaded = await loader(missing)
+            # owners without any data are cached as well, as an empty value
+            loaded = {owner_id: loaded.get(owner_id, self.loads([])) for owner_id in missing}
+            if self.fills_cache:
+                try:
+                    await self._write(loaded, stamps)
+                except RedisError as exc:
+                    cache_errors.labels(self.name).inc()
+                    logger.warning(f"{self.name} cache unavailable: {exc}")
+            cached.update(loaded)
+        return cached
+
+    async def write_through(self, owner_id: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Call after the owner's data changed and was committed: bump the version and store the fresh value."""
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                # the version outlives every entry written under an older one, see the class docstring
+                pipe.incr(self._version_key(owner_id))
+                pipe.expire(self._version_key(owner_id), 2 * self.ttl)
+                pipe.get(self._generation_key)
+                version, _, generation = await pipe.execute()
+            value = await loader()
+            await self._write({owner_id: value}, {owner_id: self._stamp(generation, version)})
+            return value
+        except RedisError as exc:
+            cache_errors.labels(self.name).inc()
+            logger.warning(f"{self.name} cache unavailable: {exc}")
+
+    async def invalidate(self, owner_id: Any) -> None:
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(self._version_key(owner_id))
+                pipe.expire(self._version_key(owner_id), 2 * self.ttl)
+                pipe.delete(self._data_key(owner_id))
+                await pipe.execute()
+        except RedisError as exc:
+            cache_errors.labels(self.name).inc()
+            logger.warning(f"{self.name} cache unavailable: {exc}")
+
+    async def invalidate_all(self) -> None:
+        """Make every entry of this cache stale at once, they expire by their TTL."""
+        try:
+            await self.redis.incr(self._generation_key)
+        except RedisError as exc:
+            cache_errors.labels(self.name).inc()
+            logger.warning(f"{self.name} cache unavailable: {exc}")
+
+
+QUIZ_RESULT_CACHE_FIELDS = ['result_id', 'user_id', 'quiz_id', 'question_id', 'user_answer_id', 'result', 'timestamp']
+CachedQuizResult = namedtuple("CachedQuizResult", QUIZ_RESULT_CACHE_FIELDS)
+
+
+class QuizResultsCache(VersionedCache):
+    """All quiz results of one user, as CachedQuizResult rows ordered by result_id."""
+
+    name = "quiz_results"
+
+    def __init__(self, redis: aioredis.Redis, quiz_result_crud):
+        super().__init__(redis, ttl=settings.CACHE_QUIZ_RESULTS_TTL,
+                         fills_cache=not is_replica_session(quiz_result_crud.session))
+        self.quiz_result_crud = quiz_result_crud
+
+    def dumps(self, rows: List[CachedQuizResult]) -> list:
+        # positional lists instead of dicts keep the entries several times smaller
+        return [[*row[:-1], row.timestamp.isoformat()] for row in rows]
+
+    def loads(self, rows: list) -> List[CachedQuizResult]:
+        return [CachedQuizResult(*row[:-1], datetime.fromisoformat(row[-1])) for row in rows]
+
+    async def _load(self, user_ids: List[int]) -> Dict[int, List[CachedQuizResult]]:
+        rows = await self.quiz_result_crud.get_columns_in(QUIZ_RESULT_CACHE_FIELDS, user_ids, field_name='user_id')
+        results_by_user = {}
+        for row in sorted(rows, key=lambda row: row.result_id):
+            results_by_user.setdefault(row.user_id, []).append(CachedQuizResult(*row))
+        return results_by_user
+
+    async def _load_user(self, user_id: int) -> List[CachedQuizResult]:
+        return (await self._load([user_id])).get(user_id, [])
+
+    async def get(self, user_id: int) -> List[CachedQuizResult]:
+        return await self.get_or_load(user_id, partial(self._load_user, user_id))
+
+    async def get_many(self, user_ids: Iterable[int]) -> Dict[int, List[CachedQuizResult]]:
+        return await self.get_many_or_load(user_ids, self._load)
+
+    async def refresh(self, user_id: int) -> None:
+        await self.write_through(user_id, partial(self._load_user, user_id))
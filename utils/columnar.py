@@ -0,0 +1,45 @@
+import io
+from typing import Iterable, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# typed columns for the quiz result exports; the repeating ids are dictionary encoded
+QUIZ_RESULT_COLUMNS = {
+    'result_id': pa.int32(),
+    'user_id': pa.dictionary(pa.int32(), pa.int32()),
+    'quiz_id': pa.dictionary(pa.int32(), pa.int32()),
+    'question_id': pa.dictionary(pa.int32(), pa.int32()),
+    'user_answer_id': pa.int32(),
+    'result': pa.bool_(),
+    'company_id': pa.dictionary(pa.int32(), pa.int32()),
+    'timestamp': pa.timestamp('us'),
+}
+
+COMPRESSION = 'zstd'
+
+
+def quiz_results_schema(field_names: Sequence[str]) -> pa.Schema:
+    return pa.schema([(field_name, QUIZ_RESULT_COLUMNS[field_name]) for field_name in field_names])
+
+
+def quiz_results_to_table(rows: Iterable[Sequence], field_names: Sequence[str]) -> pa.Table:
+    """Build an Arrow table from quiz result rows whose values follow `field_names`."""
+    schema = quiz_results_schema(field_names)
+    columns = [list(column) for column in zip(*rows)] or [[] for _ in field_names]
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+def write_parquet(table: pa.Table) -> bytes:
+    sink = io.BytesIO()
+    pq.write_table(table, sink, compression=COMPRESSION)
+    return sink.getvalue()
+
+
+def write_arrow_ipc(table: pa.Table) -> bytes:
+    """Arrow IPC file format, readable without parsing through pa.memory_map + pa.ipc.open_file."""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression=COMPRESSION)) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
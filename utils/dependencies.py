@@ -1,4 +1,7 @@
-from db.session import get_session
+import redis.asyncio as aioredis
+
+from db.session import get_session, get_read_session, get_redis
+from db.unit_of_work import UnitOfWork
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends
 
@@ -10,27 +13,46 @@ from services.analytics import AnalyticsService
 from services.notifications import NotificationsService
 
 
-def get_users_service(session: AsyncSession = Depends(get_session)) -> UsersService:
-    return UsersService(session)
+def get_unit_of_work(session: AsyncSession = Depends(get_session)) -> UnitOfWork:
+    return UnitOfWork(session)
+
+
+def get_users_service(session: AsyncSession = Depends(get_session),
+                      redis: aioredis.Redis = Depends(get_redis)) -> UsersService:
+    return UsersService(session, redis)
+
+
+def get_users_read_service(session: AsyncSession = Depends(get_read_session),
+                           redis: aioredis.Redis = Depends(get_redis)) -> UsersService:
+    return UsersService(session, redis)
 
 
 def get_auth_service(session: AsyncSession = Depends(get_session)) -> AuthService:
     return AuthService(session)
 
 
-def get_company_service(session: AsyncSession = Depends(get_session)) -> CompanyService:
-    return CompanyService(session)
+def get_company_service(session: AsyncSession = Depends(get_session),
+                        redis: aioredis.Redis = Depends(get_redis)) -> CompanyService:
+    return CompanyService(session, redis)
+
+
+def get_company_read_service(session: AsyncSession = Depends(get_read_session),
+                             redis: aioredis.Redis = Depends(get_redis)) -> CompanyService:
+    return CompanyService(session, redis)
 
 
-def get_quiz_service(session: AsyncSession = Depends(get_session)) -> QuizService:
-    return QuizService(session)
+def get_quiz_service(session: AsyncSession = Depends(get_session),
+                     redis: aioredis.Redis = Depends(get_redis)) -> QuizService:
+    return QuizService(session, redis)
 
 
-def get_analytics_service(session: AsyncSession = Depends(get_session)) -> AnalyticsService:
-    return AnalyticsService(session)
+def get_analytics_service(session: AsyncSession = Depends(get_read_session),
+                          redis: aioredis.Redis = Depends(get_redis)) -> AnalyticsService:
+    return AnalyticsService(session, redis)
 
 
-def get_notifications_service(session: AsyncSession = Depends(get_session)) -> NotificationsService:
-    return NotificationsService(session)
+def get_notifications_service(session: AsyncSession = Depends(get_session),
+                              redis: aioredis.Redis = Depends(get_redis)) -> NotificationsService:
+    return NotificationsService(session, redis)
 
 
@@ -1,7 +1,91 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
+from prometheus_client import Counter, Gauge, Histogram
+
+from config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+password_hash_queued = Gauge("company_api_password_hash_queued", "bcrypt calls waiting for a free worker thread")
+password_hash_in_flight = Gauge("company_api_password_hash_in_flight", "bcrypt calls running on a worker thread")
+password_hash_rejected = Counter("company_api_password_hash_rejected_total",
+                                 "bcrypt calls refused because the queue was full")
+password_hash_wait_seconds = Histogram("company_api_password_hash_wait_seconds",
+                                       "Time a bcrypt call waited for a worker thread")
+password_hash_seconds = Histogram("company_api_password_hash_seconds", "Time spent in bcrypt", ["operation"])
+
+
+class PasswordHashExecutor:
+    """Runs bcrypt on a small dedicated thread pool, so a burst of logins never blocks the event loop.
+
+    At most `max_workers` hashes run at once; when `max_pending` calls are already waiting or running,
+    new ones are refused with 503 instead of queueing without bound (0 disables the limit).
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, operation: str, func: Callable[..., Any], *args: Any) -> Any:
+        if self.max_pending and self.pending >= self.max_pending:
+            password_hash_rejected.inc()
+            raise HTTPException(status_code=503, detail="Too many requests, try again later")
+
+        submitted = time.perf_counter()
+
+        def timed_call():
+            started = time.perf_counter()
+            password_hash_queued.dec()
+            password_hash_in_flight.inc()
+            password_hash_wait_seconds.observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                password_hash_in_flight.dec()
+                password_hash_seconds.labels(operation).observe(time.perf_counter() - started)
+
+        # only touched from the event loop thread, no lock needed
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        password_hash_queued.inc()
+        future = self.executor.submit(timed_call)
+        try:
+            return await asyncio.wrap_future(future, loop=loop)
+        finally:
+            # a cancelled request (e.g. the client went away) must give its slot back exactly once:
+            # right away if the call never started, when the thread is done if bcrypt is already running
+            if future.cancel():
+                password_hash_queued.dec()
+                self._release()
+            elif future.done():
+                self._release()
+            else:
+                future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+
+    def _release(self) -> None:
+        self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hash_executor = PasswordHashExecutor(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
+
 
 class Hasher:
     @staticmethod
@@ -11,3 +95,11 @@ class Hasher:
     @staticmethod
     def get_password_hash(password: str) -> str:
         return pwd_context.hash(password)
+
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+        return await password_hash_executor.run("verify", pwd_context.verify, plain_password, hashed_password)
+
+    @staticmethod
+    async def get_password_hash_async(password: str) -> str:
+        return await password_hash_executor.run("hash", pwd_context.hash, password)
@@ -1,8 +1,15 @@
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+import time
+from typing import Optional
+
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+from jose import jwt, JOSEError
 from datetime import datetime, timedelta
 import config
+from utils.cache import TTLCache
 
 SECRET_KEY = config.SECRET_KEY
 
@@ -10,11 +17,122 @@ ALGORITHM = config.ALGORITHM
 bearer_scheme = HTTPBearer()
 
 
+class InvalidTokenError(Exception):
+    pass
+
+
+class TokenSigningError(Exception):
+    pass
+
+
+def _read_key(path: str) -> str:
+    with open(path) as key_file:
+        return key_file.read()
+
+
+class JWTBackend(ABC):
+    """A JWT library behind one interface; whatever the library raises comes out as one of the errors above."""
+
+    def __init__(self, algorithm: str, signing_key: Optional[str], verifying_key: str):
+        self.algorithm = algorithm
+        self.signing_key = signing_key
+        self.verifying_key = verifying_key
+
+    @abstractmethod
+    def encode(self, claims: dict) -> str:
+        """Return the signed token, raise TokenSigningError otherwise (e.g. no or a bad private key)."""
+
+    @abstractmethod
+    def decode(self, token: str) -> dict:
+        """Return the verified claims, raise InvalidTokenError otherwise."""
+
+
+class JoseBackend(JWTBackend):
+    """python-jose: HS*, RS* and ES* tokens."""
+
+    def encode(self, claims: dict) -> str:
+        try:
+            return jwt.encode(claims, self.signing_key, algorithm=self.algorithm)
+        except (JOSEError, ValueError, TypeError) as exc:
+            raise TokenSigningError(str(exc)) from exc
+
+    def decode(self, token: str) -> dict:
+        try:
+            return jwt.decode(token, self.verifying_key, algorithms=self.algorithm)
+        except (JOSEError, ValueError, TypeError) as exc:
+            raise InvalidTokenError(str(exc)) from exc
+
+
+class PyJWTBackend(JWTBackend):
+    """PyJWT, several times faster than python-jose and the only one of the two with EdDSA.
+
+    Optional: install it with `pip install "pyjwt[crypto]"` and set JWT_BACKEND=pyjwt.
+    """
+
+    def __init__(self, algorithm: str, signing_key: Optional[str], verifying_key: str):
+        import jwt as pyjwt
+
+        super().__init__(algorithm, signing_key, verifying_key)
+        self.pyjwt = pyjwt
+
+    def encode(self, claims: dict) -> str:
+        # a missing or malformed PEM key surfaces from cryptography as ValueError / TypeError
+        try:
+            return self.pyjwt.encode(claims, self.signing_key, algorithm=self.algorithm)
+        except (self.pyjwt.PyJWTError, ValueError, TypeError) as exc:
+            raise TokenSigningError(str(exc)) from exc
+
+    def decode(self, token: str) -> dict:
+        try:
+            return self.pyjwt.decode(token, self.verifying_key, algorithms=[self.algorithm])
+        except (self.pyjwt.PyJWTError, ValueError, TypeError) as exc:
+            raise InvalidTokenError(str(exc)) from exc
+
+
+JWT_BACKENDS = {"jose": JoseBackend, "pyjwt": PyJWTBackend}
+
+
+def create_jwt_backend(settings: config.Settings = config.settings) -> JWTBackend:
+    """HS* algorithms sign with SECRET_KEY, asymmetric ones (ES256, EdDSA, RS256...) with the PEM key files."""
+    if ALGORITHM.startswith("HS"):
+        signing_key = verifying_key = SECRET_KEY
+    else:
+        # a service that only verifies tokens does not need the private key
+        signing_key = _read_key(settings.JWT_PRIVATE_KEY_FILE) if settings.JWT_PRIVATE_KEY_FILE else None
+        verifying_key = _read_key(settings.JWT_PUBLIC_KEY_FILE)
+    return JWT_BACKENDS[settings.JWT_BACKEND](ALGORITHM, signing_key, verifying_key)
+
+
+jwt_backend = create_jwt_backend()
+
+# sha256 of the token -> its verified claims; decode_bearer_token also runs on the threadpool, hence the lock
+verified_tokens = TTLCache(maxsize=config.settings.JWT_CACHE_SIZE, ttl=config.settings.JWT_CACHE_TTL)
+verified_tokens_lock = threading.Lock()
+
+
+def verify_token(token: str) -> dict:
+    """Verify the signature once and serve the claims from memory until the token expires."""
+    digest = hashlib.sha256(token.encode()).digest()
+    with verified_tokens_lock:
+        claims = verified_tokens.get(digest)
+    if claims is not None:
+        return dict(claims)
+
+    claims = jwt_backend.decode(token)
+    ttl: Optional[float] = None
+    if "exp" in claims:
+        ttl = min(verified_tokens.ttl, float(claims["exp"]) - time.time())
+    if ttl is None or ttl > 0:
+        with verified_tokens_lock:
+            verified_tokens.set(digest, claims, ttl=ttl)
+    return dict(claims)
+
+
 def decode_bearer_token(credentials: HTTPAuthorizationCredentials = Security(bearer_scheme)):
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=ALGORITHM)
+        payload = verify_token(credentials.credentials)
         return payload
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
 
@@ -23,7 +141,7 @@ def encode_bearer_token(email: str) -> dict:
         now = datetime.utcnow()
         access_token_expires = now + timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
         token_data = {"email": email, "exp": access_token_expires}
-        access_token = jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
+        access_token = jwt_backend.encode(token_data)
         return {"access_token": access_token, "token_type": "bearer"}
-    except JWTError:
+    except TokenSigningError:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -0,0 +1,22 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# int dict keys are written as strings, the same as the stdlib json module did
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, option=ORJSON_OPTIONS)
+
+
+def loads(data: bytes | str) -> Any:
+    return orjson.loads(data)
+
+
+class ORJSONResponse(JSONResponse):
+    """Default response class of the app, the body is rendered by orjson instead of json.dumps."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)